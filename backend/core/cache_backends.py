@@ -0,0 +1,417 @@
+"""
+Backends de armazenamento para o cache de respostas
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Set
+
+from .config import CACHE_BACKEND, REDIS_URL, CACHE_KEY_PREFIX
+
+
+class CacheBackend:
+    """Interface comum para os backends de cache de respostas"""
+
+    name = "base"
+    # Indica se o cache é compartilhado entre workers
+    shared = False
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Obter entrada do cache (None se ausente ou expirada)"""
+        raise NotImplementedError
+
+    def set(self, key: str, entry: Dict[str, Any], ttl: int,
+            tags: Iterable[str] = (), started_at: Optional[float] = None):
+        """
+        Armazenar entrada com tempo de vida em segundos.
+
+        A entrada fica associada às tags informadas. Se alguma delas foi
+        invalidada depois de started_at (início da requisição que gerou a
+        resposta), a entrada já nasceu desatualizada e não é armazenada.
+        """
+        raise NotImplementedError
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Remover todas as entradas associadas às tags; retorna quantas foram removidas"""
+        raise NotImplementedError
+
+    def add_encoding(self, key: str, encoding: str, body: bytes):
+        """Anexar variante comprimida a uma entrada existente"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """Remover entrada do cache"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remover todas as entradas"""
+        raise NotImplementedError
+
+    def clear_expired(self):
+        """Remover entradas expiradas (no-op para backends com TTL nativo)"""
+        pass
+
+    def size(self) -> int:
+        """Número de entradas armazenadas"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas específicas do backend"""
+        return {'backend': self.name, 'shared': self.shared}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Cache LRU em memória do processo (um por worker).
+
+    Usa um OrderedDict para que get/set/evict sejam O(1): cada acesso move a
+    entrada para o fim e a remoção sempre começa pela entrada menos usada.
+    Limita tanto o número de entradas quanto o total de bytes armazenados.
+    """
+
+    name = "memory"
+    shared = False
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._total_bytes = 0
+        # Índice tag -> chaves e momento da última invalidação de cada tag
+        self._tag_index: Dict[str, Set[str]] = {}
+        self._tag_invalidated_at: Dict[str, float] = {}
+        self.max_ttl = 0
+        self.evictions = {'lru': 0, 'bytes': 0, 'expired': 0, 'invalidated': 0}
+
+    @staticmethod
+    def _entry_size(entry: Dict[str, Any]) -> int:
+        """Tamanho em bytes do corpo e das variantes comprimidas"""
+        return len(entry['body']) + sum(len(v) for v in entry['encodings'].values())
+
+    def _unlink(self, key: str, entry: Dict[str, Any]):
+        self._total_bytes -= entry['size']
+        for tag in entry['tags']:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+
+    def _remove(self, key: str) -> Dict[str, Any]:
+        entry = self._entries.pop(key)
+        self._unlink(key, entry)
+        return entry
+
+    def _evict_oldest(self, reason: str):
+        key, entry = self._entries.popitem(last=False)
+        self._unlink(key, entry)
+        self.evictions[reason] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        # Verificar se não expirou
+        if time.monotonic() > entry['expires_at']:
+            self._remove(key)
+            self.evictions['expired'] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: Dict[str, Any], ttl: int,
+            tags: Iterable[str] = (), started_at: Optional[float] = None):
+        tags = set(tags)
+        if started_at is not None and any(
+            self._tag_invalidated_at.get(tag, 0) >= started_at for tag in tags
+        ):
+            return
+
+        size = self._entry_size(entry)
+        # Entradas maiores que o limite total nunca cabem no cache
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        # Remover as entradas menos usadas até caber a nova
+        while self._entries and len(self._entries) >= self.max_entries:
+            self._evict_oldest('lru')
+        while self._entries and self._total_bytes + size > self.max_bytes:
+            self._evict_oldest('bytes')
+
+        now = time.monotonic()
+        self._entries[key] = {
+            **entry,
+            'size': size,
+            'tags': tags,
+            'created_at': now,
+            'encodings': dict(entry['encodings']),
+            'expires_at': now + ttl,
+        }
+        self._total_bytes += size
+        self.max_ttl = max(self.max_ttl, ttl)
+        for tag in tags:
+            self._tag_index.setdefault(tag, set()).add(key)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        now = time.time()
+        removed = 0
+        for tag in tags:
+            self._tag_invalidated_at[tag] = now
+            for key in list(self._tag_index.get(tag, ())):
+                self._remove(key)
+                removed += 1
+        self.evictions['invalidated'] += removed
+        return removed
+
+    def add_encoding(self, key: str, encoding: str, body: bytes):
+        entry = self._entries.get(key)
+        if entry is None or encoding in entry['encodings']:
+            return
+        if self._total_bytes + len(body) > self.max_bytes:
+            return
+
+        entry['encodings'][encoding] = body
+        entry['size'] += len(body)
+        self._total_bytes += len(body)
+
+    def delete(self, key: str):
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._tag_index.clear()
+        self._total_bytes = 0
+
+    def clear_expired(self):
+        now = time.monotonic()
+        expired_keys = [
+            key for key, value in self._entries.items()
+            if now > value['expires_at']
+        ]
+
+        for key in expired_keys:
+            self._remove(key)
+        self.evictions['expired'] += len(expired_keys)
+
+        # Invalidações mais antigas que o maior TTL não afetam mais nenhuma requisição
+        cutoff = time.time() - self.max_ttl
+        for tag in [t for t, at in self._tag_invalidated_at.items() if at < cutoff]:
+            del self._tag_invalidated_at[tag]
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **super().get_stats(),
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'tags': len(self._tag_index),
+            'evictions': dict(self.evictions),
+        }
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache compartilhado em um servidor que fala o protocolo Redis.
+
+    Aceita um cliente já construído (qualquer objeto com a API do redis-py,
+    como o fakeredis em testes locais, que precisa do lupa para os scripts
+    Lua) ou cria um a partir de REDIS_URL.
+    Falhas de conexão são tratadas como cache miss para não derrubar requisições.
+    """
+
+    name = "redis"
+    shared = True
+    ENCODING_FIELD_PREFIX = b"enc:"
+    HEADER_FIELD_PREFIX = b"hdr:"
+    INVALIDATION_MARKER_TTL = 24 * 60 * 60
+
+    # Gravação atômica: confere os marcadores de invalidação das tags e grava
+    # a entrada no mesmo script, sem janela para uma invalidação no meio.
+    # KEYS: entrada, n conjuntos de tags, n marcadores de invalidação
+    # ARGV: n, started_at (-1 = sem verificação), ttl, chave da entrada, campos...
+    SET_SCRIPT = """
+    local ntags = tonumber(ARGV[1])
+    local started_at = tonumber(ARGV[2])
+    local ttl = tonumber(ARGV[3])
+    if started_at >= 0 then
+        for i = 1, ntags do
+            local invalidated_at = redis.call('GET', KEYS[1 + ntags + i])
+            if invalidated_at and tonumber(invalidated_at) >= started_at then
+                return 0
+            end
+        end
+    end
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], unpack(ARGV, 5))
+    redis.call('EXPIRE', KEYS[1], ttl)
+    for i = 1, ntags do
+        redis.call('SADD', KEYS[1 + i], ARGV[4])
+        redis.call('EXPIRE', KEYS[1 + i], ttl)
+    end
+    return 1
+    """
+
+    # Invalidação atômica do marcador e do conjunto da tag; devolve as entradas,
+    # removidas depois pelo Python (o script só toca chaves declaradas em KEYS,
+    # como exige o Redis Cluster). Uma gravação entre o script e a remoção é
+    # recusada pelo SET_SCRIPT, porque o marcador já está gravado.
+    # KEYS: conjunto da tag, marcador; ARGV: momento, TTL do marcador
+    INVALIDATE_SCRIPT = """
+    redis.call('SET', KEYS[2], ARGV[1], 'EX', tonumber(ARGV[2]))
+    local keys = redis.call('SMEMBERS', KEYS[1])
+    redis.call('DEL', KEYS[1])
+    return keys
+    """
+
+    def __init__(self, client=None, url: str = REDIS_URL, prefix: str = CACHE_KEY_PREFIX):
+        if client is None:
+            import redis  # Dependência opcional, só necessária com CACHE_BACKEND=redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.errors = 0
+        self._set_script = client.register_script(self.SET_SCRIPT)
+        self._invalidate_script = client.register_script(self.INVALIDATE_SCRIPT)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}entry:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def _invalidated_key(self, tag: str) -> str:
+        return f"{self.prefix}invalidated:{tag}"
+
+    def _report_error(self, operation: str, error: Exception):
+        self.errors += 1
+        print(f"⚠️ Redis cache {operation} failed: {error}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            fields = self.client.hgetall(self._key(key))
+        except Exception as e:
+            self._report_error("get", e)
+            return None
+
+        if not fields or b'body' not in fields:
+            return None
+
+        return {
+            'body': fields[b'body'],
+            'status_code': int(fields[b'status_code']),
+            'content_type': fields[b'content_type'].decode(),
+            'etag': fields[b'etag'].decode() if b'etag' in fields else None,
+            'encodings': {
+                name[len(self.ENCODING_FIELD_PREFIX):].decode(): value
+                for name, value in fields.items()
+                if name.startswith(self.ENCODING_FIELD_PREFIX)
+            },
+            'headers': {
+                name[len(self.HEADER_FIELD_PREFIX):].decode(): value.decode()
+                for name, value in fields.items()
+                if name.startswith(self.HEADER_FIELD_PREFIX)
+            },
+        }
+
+    def set(self, key: str, entry: Dict[str, Any], ttl: int,
+            tags: Iterable[str] = (), started_at: Optional[float] = None):
+        tags = list(tags)
+        # Cada entrada é um hash: metadados, corpo bruto, uma variante por encoding
+        # e os headers da rota que precisam ser reenviados
+        mapping = {
+            'body': entry['body'],
+            'status_code': entry['status_code'],
+            'content_type': entry['content_type'],
+        }
+        if entry.get('etag'):
+            mapping['etag'] = entry['etag']
+        for encoding, body in entry['encodings'].items():
+            mapping[f"enc:{encoding}"] = body
+        for name, value in entry.get('headers', {}).items():
+            mapping[f"hdr:{name}"] = value
+
+        fields = [item for pair in mapping.items() for item in pair]
+        try:
+            self._set_script(
+                keys=[self._key(key), *(self._tag_key(tag) for tag in tags),
+                      *(self._invalidated_key(tag) for tag in tags)],
+                args=[len(tags), repr(started_at) if started_at is not None else -1, ttl, key, *fields],
+            )
+        except Exception as e:
+            self._report_error("set", e)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        now = time.time()
+        try:
+            entry_keys = set()
+            for tag in tags:
+                # Marcador guardado pelo maior TTL possível de uma entrada
+                entry_keys.update(self._invalidate_script(
+                    keys=[self._tag_key(tag), self._invalidated_key(tag)],
+                    args=[repr(now), self.INVALIDATION_MARKER_TTL],
+                ))
+            if not entry_keys:
+                return 0
+            # Um DEL por chave: no Redis Cluster as entradas ficam em slots diferentes
+            pipe = self.client.pipeline(transaction=False)
+            for key in entry_keys:
+                pipe.delete(self._key(key.decode() if isinstance(key, bytes) else key))
+            return sum(pipe.execute())
+        except Exception as e:
+            self._report_error("invalidate_tags", e)
+            return 0
+
+    def add_encoding(self, key: str, encoding: str, body: bytes):
+        try:
+            # Só anexar se a entrada ainda existe, para não criar hash sem TTL
+            if self.client.ttl(self._key(key)) > 0:
+                self.client.hset(self._key(key), f"enc:{encoding}", body)
+        except Exception as e:
+            self._report_error("add_encoding", e)
+
+    def delete(self, key: str):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            self._report_error("delete", e)
+
+    def _scan_keys(self, pattern: str = "*"):
+        return self.client.scan_iter(match=f"{self.prefix}{pattern}", count=500)
+
+    def clear(self):
+        try:
+            keys = list(self._scan_keys())
+            if keys:
+                self.client.delete(*keys)
+        except Exception as e:
+            self._report_error("clear", e)
+
+    def size(self) -> int:
+        try:
+            return sum(1 for _ in self._scan_keys("entry:*"))
+        except Exception as e:
+            self._report_error("size", e)
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), 'errors': self.errors}
+
+
+def create_cache_backend(max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024) -> CacheBackend:
+    """Criar o backend de cache configurado em CACHE_BACKEND"""
+    if CACHE_BACKEND == "redis":
+        try:
+            return RedisCacheBackend()
+        except Exception as e:
+            print(f"⚠️ Could not initialize Redis cache backend, using memory: {e}")
+
+    return MemoryCacheBackend(max_entries=max_entries, max_bytes=max_bytes)
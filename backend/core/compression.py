@@ -0,0 +1,127 @@
+"""
+Compressão de respostas: negociação de Accept-Encoding e codecs br/zstd/gzip
+"""
+import zlib
+from typing import Dict, Optional
+
+from .config import GZIP_COMPRESSION_LEVEL, BROTLI_COMPRESSION_LEVEL, ZSTD_COMPRESSION_LEVEL
+
+# Codecs opcionais: sem o pacote instalado o encoding simplesmente não é oferecido
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Ordem de preferência do servidor para desempate entre qualidades iguais
+PREFERRED_ENCODINGS = [
+    encoding for encoding, available in (
+        ('br', brotli is not None),
+        ('zstd', zstandard is not None),
+        ('gzip', True),
+    )
+    if available
+]
+
+# Tipos de conteúdo que valem a pena comprimir (imagens e vídeos já são comprimidos)
+COMPRESSIBLE_CONTENT_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/',
+)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Converter Accept-Encoding em {encoding: qualidade}"""
+    qualities = {}
+    for part in header.split(','):
+        part = part.strip()
+        if not part:
+            continue
+
+        encoding, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[encoding.strip().lower()] = quality
+    return qualities
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Escolher o melhor encoding disponível aceito pelo cliente (None = identity)"""
+    if not accept_encoding:
+        return None
+
+    qualities = parse_accept_encoding(accept_encoding)
+    wildcard = qualities.get('*', 0.0)
+
+    best, best_quality = None, 0.0
+    for encoding in PREFERRED_ENCODINGS:
+        quality = qualities.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    """Verificar se o tipo de conteúdo se beneficia de compressão"""
+    if not content_type:
+        return False
+    return content_type.lower().startswith(COMPRESSIBLE_CONTENT_TYPES)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Comprimir o corpo inteiro com o encoding informado"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_COMPRESSION_LEVEL)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL).compress(body)
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(GZIP_COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class StreamCompressor:
+    """
+    Compressor incremental para respostas em stream.
+
+    Cada chunk é comprimido e descarregado imediatamente (sync flush), para
+    que o cliente continue recebendo dados conforme são produzidos.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_COMPRESSION_LEVEL)
+        elif encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL).compressobj()
+        elif encoding == 'gzip':
+            self._compressor = zlib.compressobj(GZIP_COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        if self.encoding == 'zstd':
+            return (
+                self._compressor.compress(chunk)
+                + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            )
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
@@ -33,6 +33,36 @@ def get_database_url():
 
     return f"mysql+pymysql://{db_user}:{encoded_password}@{db_host}:{db_port}/{db_name}"
 
+def to_async_database_url(database_url):
+    """Trocar o driver da URL pelo equivalente assíncrono (aiomysql, ou aiosqlite em testes)"""
+    for sync_prefix, async_prefix in (
+        ("mysql+pymysql://", "mysql+aiomysql://"),
+        ("mysql://", "mysql+aiomysql://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if database_url.startswith(sync_prefix):
+            return async_prefix + database_url[len(sync_prefix):]
+    return database_url
+
+def get_async_database_url():
+    """URL do banco para o engine assíncrono"""
+    return os.getenv("ASYNC_DATABASE_URL") or to_async_database_url(get_database_url())
+
+def get_replica_database_urls():
+    """URLs das réplicas de leitura, separadas por vírgula em DATABASE_REPLICA_URLS"""
+    replica_urls = os.getenv("DATABASE_REPLICA_URLS", "")
+    return [url.strip() for url in replica_urls.split(",") if url.strip()]
+
+# Depois de escrever, o usuário lê do primário por esse tempo (atraso de replicação)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# Onde guardar esse prazo: redis (compartilhado entre workers) ou memory (só um worker);
+# por padrão o mesmo backend do cache de respostas
+READ_YOUR_WRITES_BACKEND = os.getenv("READ_YOUR_WRITES_BACKEND", os.getenv("CACHE_BACKEND", "memory"))
+# Limite de usuários no registro em memória
+READ_YOUR_WRITES_MAX_USERS = int(os.getenv("READ_YOUR_WRITES_MAX_USERS", "100000"))
+# Prefixo das chaves no Redis, fora de CACHE_KEY_PREFIX para o clear() do cache não apagá-las
+READ_YOUR_WRITES_KEY_PREFIX = os.getenv("READ_YOUR_WRITES_KEY_PREFIX", "vibe:ryw:")
+
 # CORS settings
 ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -47,3 +77,63 @@ UPLOAD_DIR = "uploads"
 MAX_FILE_SIZE_MB = 50  # 50MB max for files
 MAX_AVATAR_SIZE_MB = 5  # 5MB max for avatars
 MAX_COVER_SIZE_MB = 10  # 10MB max for cover photos
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1MB chunks when streaming uploads to disk
+
+# Cache de respostas
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # memory, redis
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "vibe:cache:")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))  # 5 minutos
+# TTL para respostas com tags; só usado com backend compartilhado, onde a
+# invalidação por tags alcança todos os workers
+TAGGED_RESPONSE_CACHE_TTL = int(os.getenv("TAGGED_RESPONSE_CACHE_TTL", "3600"))
+
+# Paginação por cursor dos feeds de posts
+POSTS_PAGE_SIZE = int(os.getenv("POSTS_PAGE_SIZE", "50"))
+POSTS_MAX_PAGE_SIZE = int(os.getenv("POSTS_MAX_PAGE_SIZE", "100"))
+
+# Paginação por cursor dos comentários e respostas
+COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", "50"))
+COMMENTS_MAX_PAGE_SIZE = int(os.getenv("COMMENTS_MAX_PAGE_SIZE", "100"))
+
+# Bandeja de stories: grupos (autores) por página
+STORIES_TRAY_PAGE_SIZE = int(os.getenv("STORIES_TRAY_PAGE_SIZE", "20"))
+STORIES_TRAY_MAX_PAGE_SIZE = int(os.getenv("STORIES_TRAY_MAX_PAGE_SIZE", "50"))
+
+# Arquivamento de stories expiradas (tarefa periódica)
+STORY_SWEEP_INTERVAL_SECONDS = int(os.getenv("STORY_SWEEP_INTERVAL_SECONDS", "60"))
+STORY_SWEEP_BATCH_SIZE = int(os.getenv("STORY_SWEEP_BATCH_SIZE", "500"))
+# O que fazer com a mídia das stories arquivadas: tier (mover para uploads/archive), delete ou keep
+STORY_ARCHIVE_MEDIA = os.getenv("STORY_ARCHIVE_MEDIA", "tier")
+# Visualizações de stories ficam em buffer e são gravadas em lote nesse intervalo
+STORY_VIEW_FLUSH_INTERVAL_MS = int(os.getenv("STORY_VIEW_FLUSH_INTERVAL_MS", "300"))
+# Buffer com mais visualizações que isso é gravado sem esperar o intervalo
+STORY_VIEW_BUFFER_MAX = int(os.getenv("STORY_VIEW_BUFFER_MAX", "5000"))
+# Paginação da lista de quem visualizou uma story
+STORY_VIEWERS_PAGE_SIZE = int(os.getenv("STORY_VIEWERS_PAGE_SIZE", "50"))
+STORY_VIEWERS_MAX_PAGE_SIZE = int(os.getenv("STORY_VIEWERS_MAX_PAGE_SIZE", "100"))
+# Intervalo mínimo entre atualizações do índice em memória de stories ativas
+STORY_INDEX_REFRESH_SECONDS = float(os.getenv("STORY_INDEX_REFRESH_SECONDS", "2"))
+
+# Timeline materializada: autores com audiência maior que isso não recebem
+# fan-out (seus posts são buscados na leitura)
+TIMELINE_FANOUT_MAX_AUDIENCE = int(os.getenv("TIMELINE_FANOUT_MAX_AUDIENCE", "5000"))
+# Posts recentes copiados para a timeline ao seguir / virar amigo
+TIMELINE_BACKFILL_POSTS = int(os.getenv("TIMELINE_BACKFILL_POSTS", "20"))
+
+# Reconciliação periódica dos contadores de posts (reações, comentários, compartilhamentos)
+COUNTER_RECONCILE_INTERVAL_SECONDS = int(os.getenv("COUNTER_RECONCILE_INTERVAL_SECONDS", "3600"))
+COUNTER_RECONCILE_BATCH_SIZE = int(os.getenv("COUNTER_RECONCILE_BATCH_SIZE", "1000"))
+
+# Chaves de idempotência das escritas (header Idempotency-Key) ficam guardadas por esse tempo
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+
+# Requisições que executam mais queries que isso são sinalizadas (N+1)
+DB_QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "20"))
+
+# Compressão de respostas
+GZIP_COMPRESSION_LEVEL = int(os.getenv("GZIP_COMPRESSION_LEVEL", "6"))
+BROTLI_COMPRESSION_LEVEL = int(os.getenv("BROTLI_COMPRESSION_LEVEL", "5"))
+ZSTD_COMPRESSION_LEVEL = int(os.getenv("ZSTD_COMPRESSION_LEVEL", "3"))
+# Corpos maiores que isso são comprimidos em uma thread, fora do event loop
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", str(256 * 1024)))
@@ -1,28 +1,207 @@
 """
 Configuração e conexão com banco de dados
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from .config import get_database_url
+import random
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.sql import Insert, Update, Delete
+from sqlalchemy.sql.elements import TextClause
+from .config import get_database_url, get_async_database_url, get_replica_database_urls, to_async_database_url
+from .recent_writes import create_recent_writers_backend
 
 # Configuração do banco
 SQLALCHEMY_DATABASE_URL = get_database_url()
 
-# Create engine with MySQL optimizations
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    echo=False,  # Set to True for SQL debugging
-    pool_pre_ping=True,  # Verify connections before use
-    pool_recycle=300,  # Recycle connections every 5 minutes
-    pool_size=10,  # Connection pool size
-    max_overflow=20,  # Maximum overflow connections
-    connect_args={
-        "charset": "utf8mb4",
-        "use_unicode": True,
-    }
+def _create_engine(url: str):
+    """Create engine with MySQL optimizations"""
+    if url.startswith("sqlite"):
+        return create_engine(url, echo=False)
+    return create_engine(
+        url,
+        echo=False,  # Set to True for SQL debugging
+        pool_pre_ping=True,  # Verify connections before use
+        pool_recycle=300,  # Recycle connections every 5 minutes
+        pool_size=10,  # Connection pool size
+        max_overflow=20,  # Maximum overflow connections
+        connect_args={
+            "charset": "utf8mb4",
+            "use_unicode": True,
+        }
+    )
+
+def _create_async_engine(url: str):
+    """Engine assíncrono: queries não bloqueiam o event loop (aiomysql / aiosqlite)"""
+    if url.startswith("sqlite"):
+        return create_async_engine(url, echo=False)
+    return create_async_engine(
+        url,
+        echo=False,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        pool_size=10,
+        max_overflow=20,
+        connect_args={
+            "charset": "utf8mb4",
+            "use_unicode": True,
+        }
+    )
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+
+ASYNC_DATABASE_URL = get_async_database_url()
+async_engine = _create_async_engine(ASYNC_DATABASE_URL)
+
+# Réplicas de leitura (vazio = tudo vai para o primário)
+REPLICA_DATABASE_URLS = get_replica_database_urls()
+replica_engines = [_create_engine(url) for url in REPLICA_DATABASE_URLS]
+async_replica_engines = [_create_async_engine(to_async_database_url(url)) for url in REPLICA_DATABASE_URLS]
+
+# Usuário autenticado da requisição atual e registro de quem escreveu há
+# pouco (read-your-writes), compartilhado entre workers com backend redis
+_request_user_id: ContextVar[Optional[int]] = ContextVar('request_user_id', default=None)
+# Resultado da consulta ao registro, feita uma vez por requisição em set_request_user
+_request_user_wrote: ContextVar[bool] = ContextVar('request_user_wrote', default=False)
+recent_writers = create_recent_writers_backend()
+
+async def set_request_user(user_id: int):
+    """Associar a requisição atual ao usuário autenticado"""
+    _request_user_id.set(user_id)
+    # Sem réplicas tudo já vai para o primário e o registro nem é consultado
+    wrote = await recent_writers.recently_wrote(user_id) if REPLICA_DATABASE_URLS else False
+    _request_user_wrote.set(wrote)
+
+def _user_recently_wrote() -> bool:
+    # Só lê o que a autenticação resolveu: get_bind não pode fazer I/O no event loop
+    return _request_user_wrote.get()
+
+class RoutingSession(Session):
+    """
+    Sessão que envia leituras para as réplicas e escritas para o primário.
+
+    Depois de qualquer escrita a sessão passa a usar só o primário, e o
+    usuário da requisição continua lendo do primário por
+    READ_YOUR_WRITES_SECONDS para não ver dados defasados pela replicação.
+    """
+
+    primary = engine
+    replicas = replica_engines
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.use_primary = False
+        self.has_writes = False
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not self.replicas or self.use_primary:
+            return self.primary
+
+        # SQL textual pode conter escritas; SELECT ... FOR UPDATE precisa de lock no primário
+        is_write = (
+            self._flushing
+            or isinstance(clause, (Insert, Update, Delete, TextClause))
+            or getattr(clause, '_for_update_arg', None) is not None
+        )
+        if is_write:
+            self.use_primary = True
+            self.has_writes = True
+            return self.primary
+
+        if _user_recently_wrote():
+            return self.primary
+        return random.choice(self.replicas)
+
+class AsyncRoutingSession(RoutingSession):
+    """RoutingSession usada pela AsyncSession (engines síncronos dos engines assíncronos)"""
+
+    primary = async_engine.sync_engine
+    replicas = [replica.sync_engine for replica in async_replica_engines]
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_session_writes(session, flush_context):
+    session.has_writes = True
+
+@event.listens_for(RoutingSession, "after_commit")
+def _record_user_write(session):
+    if not session.has_writes:
+        return
+    session.has_writes = False
+    user_id = _request_user_id.get()
+    if user_id is not None:
+        recent_writers.mark(user_id)
+        _request_user_wrote.set(True)
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+# expire_on_commit=False: objetos continuam legíveis após o commit sem nova query
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=AsyncRoutingSession,
+    autoflush=False,
+    expire_on_commit=False,
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class QueryStats:
+    """Contagem de queries SQL e tempo de banco acumulados em uma requisição"""
+
+    def __init__(self):
+        self.count = 0
+        self.time_ms = 0.0
+
+# Estatísticas da requisição atual (None fora de requisições HTTP)
+_request_query_stats: ContextVar[Optional[QueryStats]] = ContextVar('request_query_stats', default=None)
+
+def start_query_tracking() -> QueryStats:
+    """Iniciar a contagem de queries para a requisição atual"""
+    stats = QueryStats()
+    _request_query_stats.set(stats)
+    return stats
+
+def _record_query(context):
+    """Somar o statement às estatísticas da requisição (início guardado no contexto de execução)"""
+    started = getattr(context, "_query_started_at", None)
+    if started is None:
+        return
+    context._query_started_at = None
+    stats = _request_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.time_ms += (time.perf_counter() - started) * 1000
+
+def instrument_engine(target_engine):
+    """Registrar hooks que contam statements (inclusive os que falham) e tempo de banco por requisição"""
+    @event.listens_for(target_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started_at = time.perf_counter()
+
+    @event.listens_for(target_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _record_query(context)
+
+    @event.listens_for(target_engine, "handle_error")
+    def _handle_error(exception_context):
+        _record_query(exception_context.execution_context)
+
+def enable_sqlite_foreign_keys(target_engine):
+    """SQLite só aplica chaves estrangeiras (e ON DELETE CASCADE) com o pragma ligado"""
+    if target_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(target_engine, "connect")
+    def _enable_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+for _engine in (engine, async_engine.sync_engine, *replica_engines,
+                *(replica.sync_engine for replica in async_replica_engines)):
+    instrument_engine(_engine)
+    enable_sqlite_foreign_keys(_engine)
 
 class Base(DeclarativeBase):
     pass
@@ -34,3 +213,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
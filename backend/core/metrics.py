@@ -0,0 +1,183 @@
+"""
+Métricas de latência por rota (histogramas no estilo HDR)
+"""
+from typing import Dict, List, Tuple, Any
+
+from starlette.routing import Match
+
+
+class LatencyHistogram:
+    """
+    Histograma log-linear de latências em microssegundos.
+
+    Valores abaixo de 2^SUB_BUCKET_BITS caem em buckets exatos; acima disso
+    cada potência de 2 é dividida em 2^(SUB_BUCKET_BITS-1) sub-buckets, o que
+    limita o erro relativo dos percentis a ~1.6% com memória constante.
+    """
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+    SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def _index(self, value: int) -> int:
+        if value < self.SUB_BUCKET_COUNT:
+            return value
+        exponent = value.bit_length() - self.SUB_BUCKET_BITS
+        sub_bucket = value >> exponent
+        return (
+            self.SUB_BUCKET_COUNT
+            + (exponent - 1) * self.SUB_BUCKET_HALF
+            + (sub_bucket - self.SUB_BUCKET_HALF)
+        )
+
+    def _highest_equivalent_value(self, index: int) -> int:
+        if index < self.SUB_BUCKET_COUNT:
+            return index
+        offset = index - self.SUB_BUCKET_COUNT
+        exponent = offset // self.SUB_BUCKET_HALF + 1
+        sub_bucket = offset % self.SUB_BUCKET_HALF + self.SUB_BUCKET_HALF
+        return ((sub_bucket + 1) << exponent) - 1
+
+    def record(self, duration_ms: float):
+        """Registrar uma latência em milissegundos"""
+        value = max(int(duration_ms * 1000), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_us += value
+        self.max_us = max(self.max_us, value)
+
+    def percentile(self, percentile: float) -> float:
+        """Latência (ms) abaixo da qual está a fração informada das requisições"""
+        if not self.count:
+            return 0.0
+
+        threshold = percentile / 100 * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= threshold:
+                return min(self._highest_equivalent_value(index), self.max_us) / 1000
+        return self.max_us / 1000
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_us / max(self.count, 1) / 1000, 3),
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'p999_ms': self.percentile(99.9),
+            'max_ms': self.max_us / 1000,
+        }
+
+
+class RouteMetrics:
+    """Histogramas de latência por (método, rota template, status)"""
+
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str, int], LatencyHistogram] = {}
+
+    def record(self, method: str, route: str, status_code: int, duration_ms: float):
+        key = (method, route, status_code)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(duration_ms)
+
+    def clear(self):
+        self.histograms.clear()
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """Resumo por rota, ordenado pelas rotas com pior p99"""
+        routes = [
+            {'method': method, 'route': route, 'status': status, **histogram.summary()}
+            for (method, route, status), histogram in self.histograms.items()
+        ]
+        routes.sort(key=lambda r: r['p99_ms'], reverse=True)
+        return routes
+
+    def render_prometheus(self) -> str:
+        """Exposição no formato texto do Prometheus (tipo summary)"""
+        name = 'http_request_duration_seconds'
+        lines = [
+            f'# HELP {name} Latência das requisições HTTP por rota',
+            f'# TYPE {name} summary',
+        ]
+        for (method, route, status), histogram in sorted(self.histograms.items()):
+            labels = f'method="{method}",route="{_escape_label(route)}",status="{status}"'
+            for quantile in self.QUANTILES:
+                value = histogram.percentile(quantile * 100) / 1000
+                lines.append(f'{name}{{{labels},quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.total_us / 1_000_000:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class RouteQueryMetrics:
+    """Queries SQL e tempo de banco acumulados por (método, rota template)"""
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def record(self, method: str, route: str, query_count: int, db_time_ms: float, over_budget: bool):
+        stats = self.routes.get((method, route))
+        if stats is None:
+            stats = self.routes[(method, route)] = {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time_ms': 0.0, 'over_budget': 0,
+            }
+        stats['requests'] += 1
+        stats['queries'] += query_count
+        stats['max_queries'] = max(stats['max_queries'], query_count)
+        stats['db_time_ms'] += db_time_ms
+        stats['over_budget'] += int(over_budget)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """Resumo por rota, ordenado pela média de queries por requisição"""
+        routes = [
+            {
+                'method': method,
+                'route': route,
+                'requests': stats['requests'],
+                'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                'max_queries': stats['max_queries'],
+                'avg_db_time_ms': round(stats['db_time_ms'] / stats['requests'], 3),
+                'over_budget': stats['over_budget'],
+            }
+            for (method, route), stats in self.routes.items()
+        ]
+        routes.sort(key=lambda r: r['avg_queries'], reverse=True)
+        return routes
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def resolve_route_template(scope: Dict[str, Any]) -> str:
+    """
+    Obter o template da rota (ex.: /posts/{post_id}) para evitar uma série
+    por id. Respostas servidas do cache não passam pelo roteador, então a
+    rota é resolvida aqui comparando com as rotas da aplicação.
+    """
+    route = scope.get('route')
+    if route is not None and hasattr(route, 'path'):
+        return route.path
+
+    app = scope.get('app')
+    router = getattr(app, 'router', None)
+    for candidate in getattr(router, 'routes', ()):
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return getattr(candidate, 'path', scope.get('path', ''))
+
+    # Não casou com nenhuma rota: agrupar para não explodir a cardinalidade
+    return '<unmatched>'
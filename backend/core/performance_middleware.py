@@ -2,37 +2,61 @@
 Middleware de performance e otimização
 """
 import time
-import gzip
 import asyncio
-from typing import Dict, Any, Optional
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Any, Optional, Set
 from fastapi import Request, Response
 from fastapi.responses import JSONResponse
 import json
 import hashlib
-from datetime import datetime, timedelta
+
+from .cache_backends import CacheBackend, create_cache_backend
+from .compression import StreamCompressor, choose_encoding, compress, is_compressible
+from .database import start_query_tracking
+from .metrics import RouteMetrics, RouteQueryMetrics, resolve_route_template
+from .config import RESPONSE_CACHE_TTL, TAGGED_RESPONSE_CACHE_TTL, COMPRESSION_THREAD_MIN_SIZE, DB_QUERY_BUDGET
+
+# Tags de cache coletadas pela rota durante a requisição atual
+_response_cache_tags: ContextVar[Optional[Set[str]]] = ContextVar('response_cache_tags', default=None)
 
 class PerformanceMiddleware:
-    def __init__(self):
-        # Cache em memória para respostas
-        self.response_cache: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, cache_backend: Optional[CacheBackend] = None):
         # Estatísticas de performance
         self.stats = {
             'requests_total': 0,
             'requests_cached': 0,
             'avg_response_time': 0,
             'slow_requests': 0,
+            'requests_not_modified': 0,
+            'db_queries_total': 0,
+            'db_time_total_ms': 0.0,
+            'query_budget_exceeded': 0,
         }
+        # Histogramas de latência e contagem de queries por rota
+        self.route_metrics = RouteMetrics()
+        self.route_query_metrics = RouteQueryMetrics()
         # Configurações
-        self.CACHE_TTL = 300  # 5 minutos
+        self.CACHE_TTL = RESPONSE_CACHE_TTL
+        self.TAGGED_CACHE_TTL = TAGGED_RESPONSE_CACHE_TTL
         self.SLOW_REQUEST_THRESHOLD = 1000  # 1 segundo
+        # Headers da rota que fazem parte da resposta e precisam voltar no cache hit
+        self.CACHED_RESPONSE_HEADERS = ('x-next-cursor',)
+        self.DB_QUERY_BUDGET = DB_QUERY_BUDGET
         self.MAX_CACHE_SIZE = 1000
+        self.MAX_CACHE_BYTES = 64 * 1024 * 1024  # 64MB
         self.COMPRESSION_MIN_SIZE = 1024  # 1KB
+
+        # Backend de cache para respostas (memória do processo ou compartilhado)
+        self.cache_backend = cache_backend or create_cache_backend(
+            max_entries=self.MAX_CACHE_SIZE,
+            max_bytes=self.MAX_CACHE_BYTES
+        )
         
         # Endpoints que podem ser cacheados
         self.cacheable_endpoints = [
             '/auth/me',
             '/posts',
-            '/users/profile',
+            '/profile',
             '/stories',
         ]
         
@@ -77,55 +101,110 @@ class PerformanceMiddleware:
     
     def get_cached_response(self, cache_key: str) -> Optional[Dict[str, Any]]:
         """Obter resposta do cache se válida"""
-        if cache_key not in self.response_cache:
-            return None
-            
-        cached_data = self.response_cache[cache_key]
-        
-        # Verificar se não expirou
-        if datetime.now() > cached_data['expires_at']:
-            del self.response_cache[cache_key]
+        cached_data = self.cache_backend.get(cache_key)
+        if cached_data is None:
             return None
             
         self.stats['requests_cached'] += 1
         return cached_data
     
-    def cache_response(self, cache_key: str, response_data: Any, status_code: int = 200):
-        """Armazenar resposta no cache"""
-        # Limitar tamanho do cache
-        if len(self.response_cache) >= self.MAX_CACHE_SIZE:
-            # Remover entradas mais antigas
-            oldest_key = min(
-                self.response_cache.keys(),
-                key=lambda k: self.response_cache[k]['created_at']
-            )
-            del self.response_cache[oldest_key]
+    def cache_response(self, cache_key: str, body: bytes, status_code: int = 200,
+                       content_type: str = 'application/json',
+                       encodings: Optional[Dict[str, bytes]] = None,
+                       tags: Optional[Set[str]] = None,
+                       started_at: Optional[float] = None,
+                       etag: Optional[str] = None,
+                       headers: Optional[Dict[str, str]] = None):
+        """Armazenar corpo já serializado (e variantes comprimidas) no cache"""
+        # Respostas com tags são invalidadas nas escritas e podem viver mais,
+        # desde que o cache seja compartilhado (senão a invalidação só atinge um worker)
+        ttl = self.CACHE_TTL
+        if tags and self.cache_backend.shared:
+            ttl = self.TAGGED_CACHE_TTL
         
-        # Armazenar no cache
-        self.response_cache[cache_key] = {
-            'data': response_data,
+        self.cache_backend.set(cache_key, {
+            'body': body,
             'status_code': status_code,
-            'created_at': datetime.now(),
-            'expires_at': datetime.now() + timedelta(seconds=self.CACHE_TTL),
-            'content_type': 'application/json'
-        }
+            'content_type': content_type,
+            'etag': etag or self.compute_etag(body),
+            'encodings': encodings or {},
+            'headers': headers or {},
+        }, ttl, tags=tags or (), started_at=started_at)
     
-    def should_compress_response(self, content: bytes, request: Request) -> bool:
-        """Verificar se a resposta deve ser comprimida"""
-        # Verificar tamanho mínimo
-        if len(content) < self.COMPRESSION_MIN_SIZE:
-            return False
-            
-        # Verificar se o cliente aceita gzip
-        accept_encoding = request.headers.get('accept-encoding', '')
-        if 'gzip' not in accept_encoding:
+    def invalidate_tags(self, *tags: str) -> int:
+        """Remover do cache as respostas que dependem das entidades informadas"""
+        return self.cache_backend.invalidate_tags(tags)
+    
+    def compute_etag(self, body: bytes) -> str:
+        """Gerar ETag forte a partir do conteúdo da resposta"""
+        return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    
+    def representation_etag(self, etag: str, encoding: Optional[str]) -> str:
+        """ETag da representação enviada (cada content-encoding tem a sua)"""
+        if not encoding:
+            return etag
+        opaque = etag.strip('"')
+        return f'"{opaque}-{encoding}"'
+    
+    def etag_matches(self, request: Request, etag: str) -> bool:
+        """Comparar If-None-Match com o ETag atual (comparação fraca, RFC 9110)"""
+        if_none_match = request.headers.get('if-none-match')
+        if not if_none_match:
             return False
+        if if_none_match.strip() == '*':
+            return True
+        
+        current = etag.strip('"')
+        for candidate in if_none_match.split(','):
+            candidate = candidate.strip()
+            if candidate.startswith('W/'):
+                candidate = candidate[2:]
+            # Aceitar o ETag de qualquer encoding do mesmo conteúdo
+            if candidate.strip('"').split('-')[0] == current:
+                return True
+        return False
+    
+    def not_modified_response(self, etag: str, x_cache: str) -> Response:
+        """Resposta 304 sem corpo para clientes com a versão atual"""
+        self.stats['requests_not_modified'] += 1
+        return Response(
+            status_code=304,
+            headers={
+                'etag': etag,
+                'vary': 'Accept-Encoding',
+                'cache-control': 'private, no-cache',
+                'x-cache': x_cache,
+            }
+        )
+    
+    def choose_response_encoding(self, request: Request, size: Optional[int]) -> Optional[str]:
+        """Escolher o encoding da resposta (None se não deve ser comprimida)"""
+        # Verificar tamanho mínimo (None = tamanho desconhecido, resposta em stream)
+        if size is not None and size < self.COMPRESSION_MIN_SIZE:
+            return None
             
-        return True
+        # Negociar br/zstd/gzip pelas qualidades do Accept-Encoding
+        return choose_encoding(request.headers.get('accept-encoding', ''))
+    
+    async def compress_response(self, content: bytes, encoding: str) -> bytes:
+        """Comprimir resposta; corpos grandes são comprimidos fora do event loop"""
+        if len(content) >= COMPRESSION_THREAD_MIN_SIZE:
+            return await asyncio.to_thread(compress, content, encoding)
+        return compress(content, encoding)
     
-    def compress_response(self, content: bytes) -> bytes:
-        """Comprimir resposta usando gzip"""
-        return gzip.compress(content)
+    async def compress_stream(self, body_iterator: AsyncIterator[bytes], encoding: str) -> AsyncIterator[bytes]:
+        """Comprimir uma resposta em stream chunk a chunk (chunks grandes fora do event loop)"""
+        compressor = StreamCompressor(encoding)
+        async for chunk in body_iterator:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if len(chunk) >= COMPRESSION_THREAD_MIN_SIZE:
+                compressed = await asyncio.to_thread(compressor.compress, chunk)
+            else:
+                compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.finish()
     
     def extract_user_id_from_request(self, request: Request) -> Optional[str]:
         """Extrair user_id do token de autorização"""
@@ -155,13 +234,33 @@ class PerformanceMiddleware:
                 response_time = (time.time() - start_time) * 1000
                 self.update_stats(response_time)
                 
-                content = json.dumps(cached_response['data']).encode()
+                content = cached_response['body']
+                etag = cached_response.get('etag') or self.compute_etag(content)
                 
-                # Comprimir se necessário
-                headers = {'content-type': 'application/json'}
-                if self.should_compress_response(content, request):
-                    content = self.compress_response(content)
-                    headers['content-encoding'] = 'gzip'
+                # Cliente já tem a versão atual: responder sem corpo
+                if self.etag_matches(request, etag):
+                    self.record_route_latency(request, 304, response_time)
+                    return self.not_modified_response(etag, 'HIT')
+                
+                self.record_route_latency(request, cached_response['status_code'], response_time)
+                
+                # Reaproveitar a variante comprimida armazenada (comprime só uma vez)
+                headers = {
+                    'content-type': cached_response['content_type'],
+                    'vary': 'Accept-Encoding',
+                    'cache-control': 'private, no-cache',
+                    'etag': etag,
+                    **cached_response.get('headers', {}),
+                }
+                encoding = self.choose_response_encoding(request, len(content))
+                if encoding:
+                    compressed = cached_response['encodings'].get(encoding)
+                    if compressed is None:
+                        compressed = await self.compress_response(content, encoding)
+                        self.cache_backend.add_encoding(cache_key, encoding, compressed)
+                    content = compressed
+                    headers['content-encoding'] = encoding
+                    headers['etag'] = self.representation_etag(etag, encoding)
                     headers['x-cache'] = 'HIT-COMPRESSED'
                 else:
                     headers['x-cache'] = 'HIT'
@@ -174,9 +273,12 @@ class PerformanceMiddleware:
         
         # Se não foi cacheado, armazenar informações para cache posterior
         request.state.start_time = start_time
+        request.state.query_stats = start_query_tracking()
         request.state.should_cache = should_cache
         if should_cache:
             request.state.cache_key = cache_key
+            request.state.cache_tags = set()
+            _response_cache_tags.set(request.state.cache_tags)
         
         return None
     
@@ -186,6 +288,7 @@ class PerformanceMiddleware:
         if hasattr(request.state, 'start_time'):
             response_time = (time.time() - request.state.start_time) * 1000
             self.update_stats(response_time)
+            self.record_route_latency(request, response.status_code, response_time)
             
             # Adicionar headers de performance
             response.headers['x-response-time'] = f"{response_time:.2f}ms"
@@ -194,6 +297,8 @@ class PerformanceMiddleware:
             if response_time > self.SLOW_REQUEST_THRESHOLD:
                 response.headers['x-slow-request'] = 'true'
                 print(f"⚠️ Slow request detected: {request.url.path} took {response_time:.2f}ms")
+            
+            self.record_query_stats(request, response)
         
         # Cache da resposta se aplicável
         if (hasattr(request.state, 'should_cache') and 
@@ -201,37 +306,82 @@ class PerformanceMiddleware:
             hasattr(request.state, 'cache_key') and
             response.status_code == 200):
             
-            # Obter conteúdo da resposta
-            if hasattr(response, 'body'):
-                try:
-                    response_data = json.loads(response.body.decode())
-                    self.cache_response(
-                        request.state.cache_key, 
-                        response_data, 
-                        response.status_code
-                    )
-                    response.headers['x-cache'] = 'MISS'
-                except (json.JSONDecodeError, AttributeError):
-                    pass
-        
-        # Comprimir resposta se aplicável
-        if (hasattr(response, 'body') and 
-            isinstance(response.body, bytes) and
-            self.should_compress_response(response.body, request)):
+            # Respostas de call_next chegam como stream: ler o corpo uma única vez
+            body = await self.read_response_body(response)
+            response.headers['x-cache'] = 'MISS'
+            response.headers['vary'] = 'Accept-Encoding'
+            
+            etag = self.compute_etag(body)
+            response.headers['etag'] = etag
+            response.headers['cache-control'] = 'private, no-cache'
+            
+            not_modified = self.etag_matches(request, etag)
+            encoding = None if not_modified else self.choose_response_encoding(request, len(body))
+            
+            encodings = {}
+            if encoding:
+                encodings[encoding] = await self.compress_response(body, encoding)
+            
+            self.cache_response(
+                request.state.cache_key,
+                body,
+                response.status_code,
+                response.headers.get('content-type', 'application/json'),
+                encodings,
+                tags=getattr(request.state, 'cache_tags', None),
+                started_at=request.state.start_time,
+                etag=etag,
+                headers={
+                    name: response.headers[name]
+                    for name in self.CACHED_RESPONSE_HEADERS
+                    if name in response.headers
+                }
+            )
             
-            compressed_body = self.compress_response(response.body)
-            response.headers['content-encoding'] = 'gzip'
-            response.headers['content-length'] = str(len(compressed_body))
+            if not_modified:
+                return self.not_modified_response(etag, 'MISS')
+            
+            if encoding:
+                body = encodings[encoding]
+                response.headers['content-encoding'] = encoding
+                response.headers['content-length'] = str(len(body))
+                response.headers['etag'] = self.representation_etag(etag, encoding)
             
-            # Criar nova resposta com conteúdo comprimido
             return Response(
-                content=compressed_body,
+                content=body,
                 status_code=response.status_code,
                 headers=dict(response.headers)
             )
         
+        # Comprimir demais respostas compressíveis que ainda não têm encoding
+        if (response.status_code not in (204, 304) and
+            'content-encoding' not in response.headers and
+            is_compressible(response.headers.get('content-type'))):
+            
+            content_length = response.headers.get('content-length')
+            size = int(content_length) if content_length else None
+            encoding = self.choose_response_encoding(request, size)
+            if encoding:
+                response.headers['content-encoding'] = encoding
+                response.headers['vary'] = 'Accept-Encoding'
+                
+                # Respostas do call_next são sempre em stream: comprimidas conforme os chunks chegam
+                if 'content-length' in response.headers:
+                    del response.headers['content-length']
+                response.body_iterator = self.compress_stream(response.body_iterator, encoding)
+        
         return response
     
+    async def read_response_body(self, response: Response) -> bytes:
+        """Obter o corpo completo da resposta (bufferizando respostas em stream)"""
+        if hasattr(response, 'body'):
+            return response.body
+        
+        chunks = []
+        async for chunk in response.body_iterator:
+            chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode())
+        return b''.join(chunks)
+    
     def update_stats(self, response_time: float):
         """Atualizar estatísticas de performance"""
         # Atualizar tempo médio de resposta
@@ -245,6 +395,31 @@ class PerformanceMiddleware:
         if response_time > self.SLOW_REQUEST_THRESHOLD:
             self.stats['slow_requests'] += 1
     
+    def record_query_stats(self, request: Request, response: Response):
+        """Expor queries SQL e tempo de banco da requisição e sinalizar excesso (N+1)"""
+        query_stats = getattr(request.state, 'query_stats', None)
+        if query_stats is None:
+            return
+        
+        response.headers['x-db-queries'] = str(query_stats.count)
+        response.headers['x-db-time'] = f"{query_stats.time_ms:.2f}ms"
+        
+        over_budget = query_stats.count > self.DB_QUERY_BUDGET
+        if over_budget:
+            response.headers['x-db-query-budget-exceeded'] = 'true'
+            self.stats['query_budget_exceeded'] += 1
+            print(f"⚠️ Query budget exceeded: {request.url.path} ran {query_stats.count} queries")
+        
+        self.stats['db_queries_total'] += query_stats.count
+        self.stats['db_time_total_ms'] += query_stats.time_ms
+        route = resolve_route_template(request.scope)
+        self.route_query_metrics.record(request.method, route, query_stats.count, query_stats.time_ms, over_budget)
+    
+    def record_route_latency(self, request: Request, status_code: int, response_time: float):
+        """Registrar latência no histograma da rota (template, método, status)"""
+        route = resolve_route_template(request.scope)
+        self.route_metrics.record(request.method, route, status_code, response_time)
+    
     def get_stats(self) -> Dict[str, Any]:
         """Obter estatísticas de performance"""
         return {
@@ -252,30 +427,51 @@ class PerformanceMiddleware:
             'cache_hit_rate': (
                 self.stats['requests_cached'] / max(self.stats['requests_total'], 1) * 100
             ),
-            'cache_size': len(self.response_cache),
+            'cache_size': self.cache_backend.size(),
+            'cache_backend': self.cache_backend.get_stats(),
             'slow_request_rate': (
                 self.stats['slow_requests'] / max(self.stats['requests_total'], 1) * 100
-            )
+            ),
+            'routes': self.route_metrics.get_stats(),
+            'db_routes': self.route_query_metrics.get_stats()
         }
     
+    def render_prometheus(self) -> str:
+        """Métricas no formato texto do Prometheus"""
+        lines = []
+        for name, value in (
+            ('http_requests_total', self.stats['requests_total']),
+            ('http_requests_cached_total', self.stats['requests_cached']),
+            ('http_requests_not_modified_total', self.stats['requests_not_modified']),
+            ('http_slow_requests_total', self.stats['slow_requests']),
+            ('db_queries_total', self.stats['db_queries_total']),
+            ('db_query_budget_exceeded_total', self.stats['query_budget_exceeded']),
+        ):
+            lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n' + self.route_metrics.render_prometheus()
+    
     def clear_cache(self):
         """Limpar cache"""
-        self.response_cache.clear()
+        self.cache_backend.clear()
     
     def clear_expired_cache(self):
         """Limpar entradas expiradas do cache"""
-        now = datetime.now()
-        expired_keys = [
-            key for key, value in self.response_cache.items()
-            if now > value['expires_at']
-        ]
-        
-        for key in expired_keys:
-            del self.response_cache[key]
+        self.cache_backend.clear_expired()
 
 # Instância global do middleware
 performance_middleware = PerformanceMiddleware()
 
+def tag_response(*tags: str):
+    """Associar a resposta da requisição atual às entidades de que ela depende"""
+    current_tags = _response_cache_tags.get()
+    if current_tags is not None:
+        current_tags.update(tags)
+
+def invalidate_cache_tags(*tags: str) -> int:
+    """Invalidar respostas cacheadas após uma escrita nas entidades informadas"""
+    return performance_middleware.invalidate_tags(*tags)
+
 # Limpar cache expirado periodicamente
 async def cleanup_cache_task():
     """Task para limpeza periódica do cache"""
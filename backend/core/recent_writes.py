@@ -0,0 +1,153 @@
+"""
+Registro de usuários que escreveram recentemente (read-your-writes)
+
+Depois de um commit com escritas, o usuário lê do primário por
+READ_YOUR_WRITES_SECONDS. O prazo precisa ser visto por todos os workers,
+porque a próxima requisição do usuário costuma cair em outro processo:
+com READ_YOUR_WRITES_BACKEND=redis ele fica no mesmo Redis do cache de
+respostas (com prefixo próprio). O backend em memória só vale para um único worker.
+
+A consulta é assíncrona e feita uma vez por requisição, na autenticação;
+o get_bind das sessões só lê o resultado guardado na requisição.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+from .config import (
+    READ_YOUR_WRITES_BACKEND, READ_YOUR_WRITES_SECONDS, READ_YOUR_WRITES_MAX_USERS,
+    READ_YOUR_WRITES_KEY_PREFIX, REDIS_URL,
+)
+
+
+class RecentWritersBackend:
+    """Interface comum para os registros de escritas recentes"""
+
+    name = "base"
+    # Indica se o registro é compartilhado entre workers
+    shared = False
+
+    def mark(self, user_id: int):
+        """Registrar que o usuário acabou de escrever"""
+        raise NotImplementedError
+
+    async def recently_wrote(self, user_id: int) -> bool:
+        """O usuário escreveu há menos de READ_YOUR_WRITES_SECONDS?"""
+        raise NotImplementedError
+
+
+class MemoryRecentWriters(RecentWritersBackend):
+    """
+    Prazos em memória do processo (um por worker).
+
+    Como o TTL é fixo, a ordem de inserção do OrderedDict é a ordem dos
+    prazos: as entradas vencidas saem do início a cada acesso, e o número de
+    usuários é limitado por max_users.
+    """
+
+    name = "memory"
+    shared = False
+
+    def __init__(self, ttl: float = READ_YOUR_WRITES_SECONDS, max_users: int = READ_YOUR_WRITES_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._deadlines: "OrderedDict[int, float]" = OrderedDict()
+
+    def _sweep(self, now: float):
+        while self._deadlines:
+            user_id, deadline = next(iter(self._deadlines.items()))
+            if deadline > now:
+                break
+            del self._deadlines[user_id]
+
+    def mark(self, user_id: int):
+        now = time.monotonic()
+        self._sweep(now)
+        self._deadlines.pop(user_id, None)
+        self._deadlines[user_id] = now + self.ttl
+        while len(self._deadlines) > self.max_users:
+            self._deadlines.popitem(last=False)
+
+    async def recently_wrote(self, user_id: int) -> bool:
+        now = time.monotonic()
+        self._sweep(now)
+        return user_id in self._deadlines
+
+
+class RedisRecentWriters(RecentWritersBackend):
+    """
+    Prazos em Redis, compartilhados entre workers (uma chave com TTL por usuário).
+
+    Se o Redis falhar, a leitura vai para o primário: é mais lento, mas
+    nunca devolve dados defasados ao autor da escrita.
+
+    O mark é chamado no after_commit, que é síncrono: dentro do event loop
+    (sessões assíncronas) o SET vai para uma task com o cliente assíncrono,
+    e só em threads (sessões síncronas) usa o cliente síncrono.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, client=None, async_client=None, url: str = REDIS_URL, prefix: str = READ_YOUR_WRITES_KEY_PREFIX,
+                 ttl: float = READ_YOUR_WRITES_SECONDS):
+        if client is None or async_client is None:
+            import redis  # Dependência opcional, só necessária com READ_YOUR_WRITES_BACKEND=redis
+            import redis.asyncio
+            client = client or redis.Redis.from_url(url)
+            async_client = async_client or redis.asyncio.Redis.from_url(url)
+        self.client = client
+        self.async_client = async_client
+        self.prefix = prefix
+        self.ttl_ms = max(1, int(ttl * 1000))
+        self.errors = 0
+        # Referências às tasks de mark pendentes (o loop só guarda referências fracas)
+        self._pending = set()
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}wrote:{user_id}"
+
+    def _report_error(self, operation: str, error: Exception):
+        self.errors += 1
+        print(f"⚠️ Redis read-your-writes {operation} failed: {error}")
+
+    def mark(self, user_id: int):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is not None:
+            task = loop.create_task(self._mark_async(user_id))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+            return
+
+        try:
+            self.client.set(self._key(user_id), 1, px=self.ttl_ms)
+        except Exception as e:
+            self._report_error("mark", e)
+
+    async def _mark_async(self, user_id: int):
+        try:
+            await self.async_client.set(self._key(user_id), 1, px=self.ttl_ms)
+        except Exception as e:
+            self._report_error("mark", e)
+
+    async def recently_wrote(self, user_id: int) -> bool:
+        try:
+            return bool(await self.async_client.exists(self._key(user_id)))
+        except Exception as e:
+            self._report_error("check", e)
+            return True
+
+
+def create_recent_writers_backend() -> RecentWritersBackend:
+    """Criar o registro configurado em READ_YOUR_WRITES_BACKEND"""
+    if READ_YOUR_WRITES_BACKEND == "redis":
+        try:
+            return RedisRecentWriters()
+        except Exception as e:
+            print(f"⚠️ Could not initialize Redis read-your-writes backend, using memory (single worker only): {e}")
+
+    return MemoryRecentWriters()
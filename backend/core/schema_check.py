@@ -0,0 +1,113 @@
+"""
+Verificação dos índices declarados nos models contra o schema do banco
+"""
+from typing import List, Tuple
+from sqlalchemy import ForeignKeyConstraint, Index, inspect
+
+from .database import Base, engine
+
+
+def _live_index_columns(inspector, table_name: str) -> List[Tuple[List[str], bool]]:
+    """(colunas, é único) de todos os índices, uniques e PK existentes na tabela"""
+    columns = [(index['column_names'], bool(index.get('unique'))) for index in inspector.get_indexes(table_name)]
+    columns += [(unique['column_names'], True) for unique in inspector.get_unique_constraints(table_name)]
+    primary_key = inspector.get_pk_constraint(table_name).get('constrained_columns')
+    if primary_key:
+        columns.append((primary_key, True))
+    return columns
+
+
+def _index_satisfied(index: Index, live_columns: List[Tuple[List[str], bool]]) -> bool:
+    declared = [column.name for column in index.columns]
+    if index.unique:
+        # Unicidade só vale com um índice único nas mesmas colunas (em qualquer ordem)
+        return any(unique and sorted(columns) == sorted(declared) for columns, unique in live_columns)
+    return any(columns[:len(declared)] == declared for columns, _ in live_columns)
+
+
+def find_missing_indexes(bind=engine) -> List[Index]:
+    """
+    Índices declarados nos models que não existem no banco.
+
+    A comparação é pelas colunas, não pelo nome: um índice existente cujas
+    primeiras colunas são as declaradas já atende às mesmas consultas.
+    Índices únicos exigem um índice único existente nas mesmas colunas.
+    Tabelas ainda inexistentes são ignoradas (create_all as cria com os índices).
+    """
+    import models  # noqa: F401 - registrar todos os models no metadata
+
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        live_columns = _live_index_columns(inspector, table.name)
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if not _index_satisfied(index, live_columns):
+                missing.append(index)
+    return missing
+
+
+def describe_index(index: Index) -> str:
+    return f"{'UNIQUE ' if index.unique else ''}{index.name} ON {index.table.name}({', '.join(column.name for column in index.columns)})"
+
+
+def create_missing_indexes(bind=engine) -> List[Index]:
+    """Criar os índices declarados que faltam no banco"""
+    missing = find_missing_indexes(bind)
+    for index in missing:
+        print(f"➕ Criando índice {describe_index(index)}")
+        index.create(bind=bind)
+    return missing
+
+
+def check_declared_indexes(bind=engine) -> bool:
+    """Avisar sobre índices declarados que faltam no banco (usado na inicialização)"""
+    missing = find_missing_indexes(bind)
+    for index in missing:
+        print(f"⚠️ Índice ausente no banco: {describe_index(index)}")
+    if missing:
+        print("   Execute maintenance/add_hot_path_indexes.py para criá-los")
+    return not missing
+
+
+def find_missing_cascades(bind=engine) -> List[ForeignKeyConstraint]:
+    """Chaves estrangeiras declaradas com ON DELETE que não têm essa regra no banco"""
+    import models  # noqa: F401 - registrar todos os models no metadata
+
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        declared = [fk for fk in table.foreign_key_constraints if fk.ondelete]
+        if not declared:
+            continue
+        live = {
+            tuple(fk['constrained_columns']): (fk.get('options') or {}).get('ondelete')
+            for fk in inspector.get_foreign_keys(table.name)
+        }
+        for fk in declared:
+            live_ondelete = live.get(tuple(fk.column_keys))
+            if (live_ondelete or "").upper() != fk.ondelete.upper():
+                missing.append(fk)
+    return missing
+
+
+def describe_foreign_key(fk: ForeignKeyConstraint) -> str:
+    columns = ", ".join(fk.column_keys)
+    return f"{fk.table.name}({columns}) -> {fk.referred_table.name} ON DELETE {fk.ondelete}"
+
+
+def check_declared_cascades(bind=engine) -> bool:
+    """Avisar sobre ON DELETE declarados que faltam no banco (usado na inicialização)"""
+    missing = find_missing_cascades(bind)
+    for fk in missing:
+        print(f"⚠️ Chave estrangeira sem ON DELETE no banco: {describe_foreign_key(fk)}")
+    if missing:
+        print("   Execute maintenance/add_cascade_foreign_keys.py para atualizá-las")
+    return not missing
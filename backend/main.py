@@ -5,10 +5,11 @@ import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
 from core.config import ALLOWED_ORIGINS
-from core.database import engine, Base
+from core.database import engine, async_engine, async_replica_engines, Base
 from core.security_middleware import security_middleware
 from core.performance_middleware import performance_middleware, start_cache_cleanup
 from core.websockets import manager
@@ -18,6 +19,12 @@ from routes.follows import router as follows_router
 from routes.reports import router as reports_router
 from routes.notifications import router as notifications_router
 from utils.auth import verify_websocket_token
+from utils.counters import start_counter_reconciliation
+from utils.deletion import set_database_cascades
+from utils.idempotency import start_idempotency_cleanup
+from utils.media_cleanup import start_media_cleanup, stop_media_cleanup
+from utils.story_archive import start_story_sweeper
+from utils.story_views import start_story_view_flusher, stop_story_view_flusher
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -40,9 +47,32 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️ Erro ao criar tabelas: {e}")
 
+    # Comparar índices declarados nos models com o schema do banco
+    try:
+        from core.schema_check import check_declared_indexes
+        if check_declared_indexes():
+            print("✅ Índices do banco verificados!")
+    except Exception as e:
+        print(f"⚠️ Erro ao verificar índices: {e}")
+
+    # Comparar ON DELETE CASCADE declarado nos models com o schema do banco
+    try:
+        from core.schema_check import check_declared_cascades
+        cascades_ready = check_declared_cascades()
+        set_database_cascades(cascades_ready)
+        if cascades_ready:
+            print("✅ Exclusões em cascata verificadas!")
+    except Exception as e:
+        print(f"⚠️ Erro ao verificar exclusões em cascata: {e}")
+
     # Iniciar tarefas de background
     print("🔧 Starting security and performance services...")
     start_cache_cleanup()
+    start_story_sweeper()
+    start_story_view_flusher()
+    start_counter_reconciliation()
+    start_idempotency_cleanup()
+    start_media_cleanup()
 
     print("🌟 API pronta para uso!")
 
@@ -50,6 +80,10 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     print("🛑 Encerrando API...")
+    await stop_story_view_flusher()
+    await stop_media_cleanup()
+    for db_engine in (async_engine, *async_replica_engines):
+        await db_engine.dispose()
 
 # Criar instância da aplicação FastAPI
 app = FastAPI(
@@ -138,9 +172,10 @@ app.add_middleware(
         "Content-Language",
         "Content-Type",
         "Authorization",
-        "X-Requested-With"
+        "X-Requested-With",
+        "If-None-Match"
     ],
-    expose_headers=["X-Response-Time", "X-Cache", "X-Slow-Request"]
+    expose_headers=["X-Response-Time", "X-Cache", "X-Slow-Request", "ETag", "X-DB-Queries", "X-DB-Time", "X-Next-Cursor"]
 )
 
 # Criar diretórios de upload se não existirem
@@ -226,6 +261,14 @@ async def get_performance_stats():
     """Endpoint para obter estatísticas de performance (apenas para desenvolvimento)"""
     return performance_middleware.get_stats()
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """Métricas de latência por rota no formato de exposição do Prometheus"""
+    return PlainTextResponse(
+        performance_middleware.render_prometheus(),
+        media_type="text/plain; version=0.0.4"
+    )
+
 @app.post("/admin/clear-cache")
 async def clear_cache():
     """Limpar cache de performance"""
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Migração para recriar as chaves estrangeiras com o ON DELETE declarado nos models
+
+Depois dela, excluir um post ou story é um único DELETE e o banco remove
+reações, comentários, visualizações etc. (ON DELETE CASCADE).
+
+Uso:
+    python maintenance/add_cascade_foreign_keys.py          # atualiza as chaves (MySQL)
+    python maintenance/add_cascade_foreign_keys.py --check  # só verifica; sai com 1 se faltar alguma
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect
+from core.database import engine
+from core.schema_check import find_missing_cascades, describe_foreign_key
+
+def check_cascades():
+    """Verificar se todas as chaves declaradas com ON DELETE estão no banco"""
+    missing = find_missing_cascades(engine)
+    if not missing:
+        print("✅ Todas as chaves estrangeiras têm o ON DELETE declarado")
+        return True
+
+    print(f"❌ {len(missing)} chave(s) estrangeira(s) sem ON DELETE no banco:")
+    for fk in missing:
+        print(f"   - {describe_foreign_key(fk)}")
+    return False
+
+def run_migration():
+    """Trocar cada chave estrangeira sem ON DELETE por uma com a regra declarada"""
+    if engine.dialect.name != "mysql":
+        print(f"❌ {engine.dialect.name} não permite alterar chaves estrangeiras; recrie as tabelas")
+        return False
+
+    missing = find_missing_cascades(engine)
+    print(f"🚀 Atualizando {len(missing)} chave(s) estrangeira(s)...")
+    inspector = inspect(engine)
+
+    with engine.begin() as connection:
+        for fk in missing:
+            table = fk.table.name
+            columns = ", ".join(fk.column_keys)
+            referred = ", ".join(element.column.name for element in fk.elements)
+            live_names = [
+                live['name'] for live in inspector.get_foreign_keys(table)
+                if live['constrained_columns'] == fk.column_keys
+            ]
+            name = live_names[0] if live_names else f"fk_{table}_{'_'.join(fk.column_keys)}"
+
+            print(f"🔗 {describe_foreign_key(fk)}")
+            if live_names:
+                connection.exec_driver_sql(f"ALTER TABLE {table} DROP FOREIGN KEY {name}")
+            connection.exec_driver_sql(
+                f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({columns}) "
+                f"REFERENCES {fk.referred_table.name} ({referred}) ON DELETE {fk.ondelete}"
+            )
+
+    return check_cascades()
+
+if __name__ == "__main__":
+    try:
+        if "--check" in sys.argv:
+            sys.exit(0 if check_cascades() else 1)
+
+        sys.exit(0 if run_migration() else 1)
+    except Exception as e:
+        print(f"❌ Erro durante a migração de chaves estrangeiras: {e}")
+        sys.exit(1)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Migração para criar os índices compostos declarados nos models
+
+Uso:
+    python maintenance/add_hot_path_indexes.py          # cria os índices ausentes
+    python maintenance/add_hot_path_indexes.py --check  # só verifica (CI); sai com 1 se faltar algum
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import engine
+from core.schema_check import find_missing_indexes, create_missing_indexes, describe_index
+
+def check_indexes():
+    """Verificar se todos os índices declarados existem no banco"""
+    missing = find_missing_indexes(engine)
+    if not missing:
+        print("✅ Todos os índices declarados existem no banco")
+        return True
+
+    print(f"❌ {len(missing)} índice(s) declarado(s) ausente(s) no banco:")
+    for index in missing:
+        print(f"   - {describe_index(index)}")
+    return False
+
+def run_migration():
+    """Criar os índices ausentes"""
+    print("🚀 Criando índices ausentes...")
+    created = create_missing_indexes(engine)
+    print(f"✅ {len(created)} índice(s) criado(s)")
+
+if __name__ == "__main__":
+    try:
+        if "--check" in sys.argv:
+            sys.exit(0 if check_indexes() else 1)
+
+        run_migration()
+        sys.exit(0 if check_indexes() else 1)
+    except Exception as e:
+        print(f"❌ Erro durante a migração de índices: {e}")
+        sys.exit(1)
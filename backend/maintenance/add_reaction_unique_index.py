@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Migração para o índice único de reações (uma reação por usuário e post)
+
+Remove reações duplicadas (mantém a mais recente), troca o índice antigo
+ix_reactions_post_id_user_id pelo único uq_reactions_post_id_user_id e
+recalcula os contadores dos posts.
+
+Uso:
+    python maintenance/add_reaction_unique_index.py
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, select, delete, func
+from core.database import engine, SessionLocal
+from core.schema_check import create_missing_indexes
+from models import Reaction
+from utils.counters import reconcile_post_counters
+
+OLD_INDEX_NAME = "ix_reactions_post_id_user_id"
+
+def remove_duplicate_reactions() -> int:
+    """Apagar reações repetidas de um mesmo usuário no mesmo post, mantendo a mais recente"""
+    keep_ids = select(func.max(Reaction.id)).group_by(Reaction.post_id, Reaction.user_id).subquery()
+    with engine.begin() as connection:
+        result = connection.execute(delete(Reaction).where(Reaction.id.not_in(select(keep_ids))))
+    return result.rowcount
+
+def drop_old_index():
+    existing = {index['name'] for index in inspect(engine).get_indexes("reactions")}
+    if OLD_INDEX_NAME in existing:
+        print(f"➖ Removendo índice antigo {OLD_INDEX_NAME}")
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                f"DROP INDEX {OLD_INDEX_NAME} ON reactions" if engine.dialect.name == "mysql"
+                else f"DROP INDEX {OLD_INDEX_NAME}"
+            )
+
+def run_migration():
+    print("🚀 Migrando reações para índice único...")
+
+    removed = remove_duplicate_reactions()
+    print(f"✅ {removed} reações duplicadas removidas")
+
+    created = create_missing_indexes(engine)
+    print(f"✅ {len(created)} índice(s) criado(s)")
+    drop_old_index()
+
+    db = SessionLocal()
+    try:
+        fixed = reconcile_post_counters(db)
+        print(f"✅ Contadores de {fixed} posts recalculados")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    try:
+        run_migration()
+        sys.exit(0)
+    except Exception as e:
+        print(f"❌ Erro durante a migração: {e}")
+        sys.exit(1)
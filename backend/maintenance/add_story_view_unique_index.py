@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Migração para o índice único de visualizações de stories
+
+Remove visualizações duplicadas (mantém a primeira), troca o índice antigo
+ix_story_views_story_id_viewer_id pelo único uq_story_views_story_id_viewer_id
+e recalcula views_count das stories (visualizações ativas + arquivadas).
+
+Uso:
+    python maintenance/add_story_view_unique_index.py
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, select, update, delete, func
+from core.database import engine
+from core.schema_check import create_missing_indexes
+from models import Story, StoryView, ArchivedStoryView
+
+OLD_INDEX_NAME = "ix_story_views_story_id_viewer_id"
+
+def remove_duplicate_views() -> int:
+    """Apagar visualizações repetidas de um mesmo usuário na mesma story, mantendo a primeira"""
+    keep_ids = select(func.min(StoryView.id)).group_by(StoryView.story_id, StoryView.viewer_id).subquery()
+    with engine.begin() as connection:
+        result = connection.execute(delete(StoryView).where(StoryView.id.not_in(select(keep_ids))))
+    return result.rowcount
+
+def drop_old_index():
+    existing = {index['name'] for index in inspect(engine).get_indexes("story_views")}
+    if OLD_INDEX_NAME in existing:
+        print(f"➖ Removendo índice antigo {OLD_INDEX_NAME}")
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                f"DROP INDEX {OLD_INDEX_NAME} ON story_views" if engine.dialect.name == "mysql"
+                else f"DROP INDEX {OLD_INDEX_NAME}"
+            )
+
+def recount_views() -> int:
+    """Recalcular views_count a partir das visualizações gravadas"""
+    live_views = (
+        select(func.count()).select_from(StoryView)
+        .where(StoryView.story_id == Story.id).scalar_subquery()
+    )
+    archived_views = (
+        select(func.count()).select_from(ArchivedStoryView)
+        .where(ArchivedStoryView.story_id == Story.id).scalar_subquery()
+    )
+    actual = live_views + archived_views
+    with engine.begin() as connection:
+        result = connection.execute(
+            update(Story)
+            .where(func.coalesce(Story.views_count, -1) != actual)
+            .values(views_count=actual)
+        )
+    return result.rowcount
+
+def run_migration():
+    print("🚀 Migrando visualizações de stories para índice único...")
+
+    removed = remove_duplicate_views()
+    print(f"✅ {removed} visualizações duplicadas removidas")
+
+    created = create_missing_indexes(engine)
+    print(f"✅ {len(created)} índice(s) criado(s)")
+    drop_old_index()
+
+    fixed = recount_views()
+    print(f"✅ Contadores de {fixed} stories recalculados")
+
+if __name__ == "__main__":
+    try:
+        run_migration()
+        sys.exit(0)
+    except Exception as e:
+        print(f"❌ Erro durante a migração: {e}")
+        sys.exit(1)
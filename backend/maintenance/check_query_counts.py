@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Teste automático: número de queries SQL constante por página nas listagens
+
+Versão independente de test_query_counts.py: não precisa de servidor nem de
+MySQL. Cria um banco SQLite temporário, cria os usuários direto no banco e
+o resto (seguidores, posts, reações, comentários) pela própria API
+(TestClient), e compara o header X-DB-Queries de uma página pequena com o de uma grande.
+Com o carregamento antecipado dos autores e a paginação por cursor, o número
+de queries tem que ser o mesmo para limit=5 e limit=20.
+
+Uso:
+    python maintenance/check_query_counts.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# O banco precisa ser escolhido antes de importar a aplicação
+_db_dir = tempfile.mkdtemp(prefix="vibe_query_counts_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'vibe.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["READ_YOUR_WRITES_BACKEND"] = "memory"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import models  # Registra todas as tabelas no Base
+from core.database import Base, SessionLocal, engine
+from core.security import create_access_token
+from main import app
+from models.user import User
+
+# Tamanhos de página comparados e número de posts criados (maior que a página grande)
+PAGE_SIZES = (5, 20)
+POSTS_TO_CREATE = 25
+
+# Listagens paginadas comparadas
+ENDPOINTS = [
+    "/posts/",
+    "/users/{author_id}/posts",
+]
+
+def create_user(name):
+    """Criar o usuário direto no banco e gerar o token (sem senha/verificação de email)"""
+    email = f"{name}@example.com"
+    db = SessionLocal()
+    try:
+        user = User(first_name=name.capitalize(), last_name="Teste", email=email,
+                    password_hash="!", is_verified=True)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    finally:
+        db.close()
+    return user_id, {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+def count_queries(client, path, headers, limit):
+    """Número de queries e de itens da página (parâmetro extra evita o cache de respostas)"""
+    response = client.get(path, headers=headers, params={"limit": limit, "_": time.time_ns()})
+    response.raise_for_status()
+    return int(response.headers["X-DB-Queries"]), len(response.json())
+
+def populate(client):
+    """Autor com POSTS_TO_CREATE posts (com reações e comentários) e um leitor que o segue"""
+    author_id, author_headers = create_user("autor")
+    reader_id, reader_headers = create_user("leitor")
+    client.post(f"/follow/{author_id}", headers=reader_headers).raise_for_status()
+
+    for i in range(POSTS_TO_CREATE):
+        post = client.post("/posts/", json={"content": f"Post {i}"}, headers=author_headers)
+        post.raise_for_status()
+        post_id = post.json()["id"]
+        client.post(f"/posts/{post_id}/reactions", json={"post_id": post_id, "reaction_type": "like"}, headers=reader_headers).raise_for_status()
+        client.post(f"/posts/{post_id}/comments", json={"post_id": post_id, "content": f"Comentário {i}"}, headers=reader_headers).raise_for_status()
+
+    return author_id, reader_headers
+
+def test_query_counts():
+    print("🧪 TESTANDO NÚMERO DE QUERIES POR PÁGINA (SQLite temporário)")
+    print("=" * 50)
+
+    Base.metadata.create_all(bind=engine)
+    # Sem o context manager o lifespan não roda: nenhuma tarefa em background
+    client = TestClient(app)
+    author_id, headers = populate(client)
+
+    success = True
+    small, large = PAGE_SIZES
+    for path in ENDPOINTS:
+        path = path.format(author_id=author_id)
+        try:
+            small_queries, small_items = count_queries(client, path, headers, small)
+            large_queries, large_items = count_queries(client, path, headers, large)
+            ok = small_queries == large_queries and (small_items, large_items) == PAGE_SIZES
+            print(f"{'✅' if ok else '❌'} {path}: {small_queries} queries ({small_items} itens) "
+                  f"vs {large_queries} queries ({large_items} itens)")
+        except Exception as e:
+            ok = False
+            print(f"❌ {path}: erro {e}")
+        success = success and ok
+
+    return success
+
+if __name__ == "__main__":
+    try:
+        success = test_query_counts()
+    finally:
+        engine.dispose()
+        shutil.rmtree(_db_dir, ignore_errors=True)
+    sys.exit(0 if success else 1)
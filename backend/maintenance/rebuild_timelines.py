@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Reconstruir a timeline materializada a partir dos posts existentes
+
+Uso:
+    python maintenance/rebuild_timelines.py [dias]   # padrão: posts dos últimos 30 dias
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import SessionLocal
+from models import Post
+from utils.timeline import fan_out_post
+
+BATCH_SIZE = 500
+
+def rebuild_timelines(days: int = 30):
+    """Refazer o fan-out de todos os posts recentes (entradas existentes são ignoradas)"""
+    db = SessionLocal()
+    since = datetime.utcnow() - timedelta(days=days)
+    last_id = 0
+    posts_processed = 0
+    entries_created = 0
+
+    try:
+        print(f"🚀 Reconstruindo timelines com posts desde {since.date()}...")
+
+        while True:
+            posts = db.query(Post).filter(
+                Post.created_at >= since,
+                Post.id > last_id
+            ).order_by(Post.id).limit(BATCH_SIZE).all()
+
+            if not posts:
+                break
+
+            for post in posts:
+                entries_created += fan_out_post(db, post)
+            db.commit()
+
+            last_id = posts[-1].id
+            posts_processed += len(posts)
+            print(f"   {posts_processed} posts processados, {entries_created} entradas criadas")
+
+        print(f"✅ Timelines reconstruídas: {posts_processed} posts, {entries_created} entradas")
+        return True
+
+    except Exception as e:
+        print(f"❌ Erro ao reconstruir timelines: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    sys.exit(0 if rebuild_timelines(days) else 1)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Recalcular os contadores de reações, comentários e compartilhamentos dos posts
+
+Também roda periodicamente em background (COUNTER_RECONCILE_INTERVAL_SECONDS);
+use este script depois de importar dados ou corrigir tabelas manualmente.
+
+Uso:
+    python maintenance/reconcile_post_counters.py
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import SessionLocal
+from utils.counters import reconcile_post_counters
+
+def main():
+    db = SessionLocal()
+    try:
+        print("🚀 Reconciliando contadores dos posts...")
+        fixed = reconcile_post_counters(db)
+        print(f"✅ Contadores reconciliados: {fixed} posts corrigidos")
+        return True
+    except Exception as e:
+        print(f"❌ Erro ao reconciliar contadores: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Teste manual: número de queries SQL constante por página nas listagens
+
+Usa o header X-DB-Queries da API. Para cada listagem, compara uma página
+pequena com uma grande: com o carregamento antecipado dos autores o número
+de queries não pode crescer com o número de itens (N+1).
+
+Para rodar sem servidor (SQLite temporário), use check_query_counts.py.
+
+Uso:
+    python maintenance/test_query_counts.py email senha
+"""
+import sys
+import time
+import requests
+
+# Configurações
+API_BASE = "http://localhost:8000"
+
+# Listagens e tamanhos de página comparados (None = sem parâmetro de página)
+ENDPOINTS = [
+    ("/posts/", "limit", (2, 50)),
+    ("/users/{user_id}/posts", "limit", (2, 50)),
+    ("/notifications/", "limit", (2, 50)),
+    ("/friendships/", None, None),
+    ("/follow/followers", None, None),
+    ("/follow/following", None, None),
+]
+
+# Máximo de queries para listagens sem paginação
+MAX_QUERIES_PER_LIST = 6
+
+def count_queries(path, headers, params=None):
+    """Número de queries executadas pela requisição (parâmetro extra evita o cache)"""
+    params = dict(params or {}, _=time.time_ns())
+    response = requests.get(f"{API_BASE}{path}", headers=headers, params=params, timeout=10)
+    response.raise_for_status()
+    return int(response.headers["X-DB-Queries"]), len(response.json())
+
+def test_query_counts(email, password):
+    print("🧪 TESTANDO NÚMERO DE QUERIES POR PÁGINA")
+    print("=" * 50)
+
+    response = requests.post(f"{API_BASE}/auth/login", json={"email": email, "password": password}, timeout=10)
+    if response.status_code != 200:
+        print(f"❌ Login falhou: {response.status_code}")
+        return False
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    user_id = requests.get(f"{API_BASE}/auth/me", headers=headers, timeout=10).json()["id"]
+
+    success = True
+    for path, page_param, page_sizes in ENDPOINTS:
+        path = path.format(user_id=user_id)
+        try:
+            if page_param:
+                small_queries, small_items = count_queries(path, headers, {page_param: page_sizes[0]})
+                large_queries, large_items = count_queries(path, headers, {page_param: page_sizes[1]})
+                ok = large_queries <= small_queries
+                print(f"{'✅' if ok else '❌'} {path}: {small_queries} queries ({small_items} itens) "
+                      f"vs {large_queries} queries ({large_items} itens)")
+            else:
+                queries, items = count_queries(path, headers)
+                ok = queries <= MAX_QUERIES_PER_LIST
+                print(f"{'✅' if ok else '❌'} {path}: {queries} queries ({items} itens)")
+        except Exception as e:
+            ok = False
+            print(f"❌ {path}: erro {e}")
+        success = success and ok
+
+    return success
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Uso: python maintenance/test_query_counts.py email senha")
+        sys.exit(1)
+    sys.exit(0 if test_query_counts(sys.argv[1], sys.argv[2]) else 1)
@@ -3,16 +3,20 @@ Modelos do banco de dados
 """
 from .user import User
 from .post import Post, Reaction, Comment, Share
-from .story import Story, StoryView, StoryTag, StoryOverlay
+from .story import Story, StoryView, ArchivedStoryView, StoryTag, StoryOverlay
 from .friendship import Friendship, Block, Follow
 from .notification import Notification, NotificationType, Message, MediaFile
 from .report import Report, ReportType, ReportStatus
+from .timeline import TimelineEntry, TimelinePullAuthor
+from .idempotency import IdempotencyKey
 
 __all__ = [
     "User",
     "Post", "Reaction", "Comment", "Share",
-    "Story", "StoryView", "StoryTag", "StoryOverlay",
+    "Story", "StoryView", "ArchivedStoryView", "StoryTag", "StoryOverlay",
     "Friendship", "Block", "Follow",
     "Notification", "NotificationType", "Message", "MediaFile",
-    "Report", "ReportType", "ReportStatus"
+    "Report", "ReportType", "ReportStatus",
+    "TimelineEntry", "TimelinePullAuthor",
+    "IdempotencyKey"
 ]
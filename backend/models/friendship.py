@@ -1,13 +1,18 @@
 """
 Modelos de relacionamentos entre usuários
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from core.database import Base
 
 class Friendship(Base):
     __tablename__ = "friendships"
+    __table_args__ = (
+        Index("ix_friendships_requester_addressee_status", "requester_id", "addressee_id", "status"),
+        # Solicitações recebidas são buscadas só pelo destinatário
+        Index("ix_friendships_addressee_id_status", "addressee_id", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     requester_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -32,6 +37,10 @@ class Block(Base):
 
 class Follow(Base):
     __tablename__ = "follows"
+    __table_args__ = (
+        Index("ix_follows_follower_id", "follower_id"),
+        Index("ix_follows_followed_id", "followed_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     follower_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -0,0 +1,20 @@
+"""
+Chaves de idempotência das escritas enviadas pelos clientes
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, UniqueConstraint
+from datetime import datetime
+from core.database import Base
+
+class IdempotencyKey(Base):
+    """Chave usada por um usuário e a resposta da escrita que ela produziu"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_id_key"),
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String(100), nullable=False)
+    response = Column(Text)  # JSON da resposta original, devolvido nas repetições
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
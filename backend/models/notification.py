@@ -1,8 +1,8 @@
 """
 Modelos de notificações e mensagens
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Enum, Index
+from sqlalchemy.orm import relationship, backref
 from datetime import datetime
 import enum
 from core.database import Base
@@ -41,6 +41,9 @@ class NotificationType(enum.Enum):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_recipient_deleted_read_created", "recipient_id", "is_deleted", "is_read", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     recipient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -50,7 +53,7 @@ class Notification(Base):
     message = Column(Text, nullable=False)
 
     # Reference to related entities
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=True)
     comment_id = Column(Integer, nullable=True)  # For comment-related notifications
     story_id = Column(Integer, nullable=True)    # For story-related notifications
     friendship_id = Column(Integer, ForeignKey("friendships.id"), nullable=True)
@@ -71,7 +74,7 @@ class Notification(Base):
     # Relationships
     recipient = relationship("User", foreign_keys=[recipient_id], backref="received_notifications")
     sender = relationship("User", foreign_keys=[sender_id], backref="sent_notifications")
-    post = relationship("Post", foreign_keys=[post_id], backref="notifications")
+    post = relationship("Post", foreign_keys=[post_id], backref=backref("notifications", passive_deletes=True))
     friendship = relationship("Friendship", foreign_keys=[friendship_id], backref="notifications")
 
 class Message(Base):
@@ -1,13 +1,17 @@
 """
 Modelos relacionados a posts
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index
+from sqlalchemy.orm import relationship, backref
 from datetime import datetime
 from core.database import Base
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_author_id_created_at", "author_id", "created_at"),
+        Index("ix_posts_created_at", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -28,38 +32,48 @@ class Post(Base):
 
 class Reaction(Base):
     __tablename__ = "reactions"
+    __table_args__ = (
+        # Uma reação por usuário e post (base do upsert em utils/interactions.py)
+        Index("uq_reactions_post_id_user_id", "post_id", "user_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
     reaction_type = Column(String(20), nullable=False)  # like, love, haha, wow, sad, angry, care, pride, grateful, celebrating
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     user = relationship("User", backref="reactions")
-    post = relationship("Post", backref="reactions")
+    post = relationship("Post", backref=backref("reactions", passive_deletes=True))
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at", "post_id", "created_at"),
+        # Comentários de primeiro nível (parent_id IS NULL) e respostas por comentário
+        Index("ix_comments_post_id_parent_id_created_at", "post_id", "parent_id", "created_at"),
+        Index("ix_comments_parent_id_created_at", "parent_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    parent_id = Column(Integer, ForeignKey("comments.id"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=True)
     reactions_count = Column(Integer, default=0)  # Contador de reações
     created_at = Column(DateTime, default=datetime.utcnow)
 
     author = relationship("User", backref="comments")
-    post = relationship("Post", backref="comments")
-    parent = relationship("Comment", remote_side=[id], backref="replies")
+    post = relationship("Post", backref=backref("comments", passive_deletes=True))
+    parent = relationship("Comment", remote_side=[id], backref=backref("replies", passive_deletes=True))
 
 class Share(Base):
     __tablename__ = "shares"
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", backref="shares")
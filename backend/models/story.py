@@ -1,13 +1,18 @@
 """
 Modelos relacionados a stories
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index
+from sqlalchemy.orm import relationship, backref
 from datetime import datetime
 from core.database import Base
 
 class Story(Base):
     __tablename__ = "stories"
+    __table_args__ = (
+        Index("ix_stories_expires_at_archived", "expires_at", "archived"),
+        # Atualização incremental do índice de stories ativas (utils/story_archive.py)
+        Index("ix_stories_created_at", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -27,33 +32,54 @@ class Story(Base):
 
 class StoryView(Base):
     __tablename__ = "story_views"
+    __table_args__ = (
+        # Uma visualização por story e usuário (base do INSERT IGNORE em utils/story_views.py)
+        Index("uq_story_views_story_id_viewer_id", "story_id", "viewer_id", unique=True),
+        # Lista de quem visualizou, em ordem de visualização (GET /stories/{id}/viewers)
+        Index("ix_story_views_story_id_viewed_at", "story_id", "viewed_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    story_id = Column(Integer, ForeignKey("stories.id"), nullable=False)
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), nullable=False)
     viewer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     viewed_at = Column(DateTime, default=datetime.utcnow)
     
-    story = relationship("Story", backref="views")
+    story = relationship("Story", backref=backref("views", passive_deletes=True))
     viewer = relationship("User", backref="story_views")
 
+class ArchivedStoryView(Base):
+    """Visualização de story já arquivada (armazenamento frio, fora de story_views)"""
+    __tablename__ = "story_views_archive"
+    __table_args__ = (
+        Index("ix_story_views_archive_story_id_viewed_at", "story_id", "viewed_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), nullable=False)
+    viewer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    viewed_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    viewer = relationship("User")
+
 class StoryTag(Base):
     __tablename__ = "story_tags"
 
     id = Column(Integer, primary_key=True, index=True)
-    story_id = Column(Integer, ForeignKey("stories.id"), nullable=False)
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), nullable=False)
     tagged_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     position_x = Column(Integer, default=50)  # Posição X em percentual (0-100)
     position_y = Column(Integer, default=50)  # Posição Y em percentual (0-100)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    story = relationship("Story", backref="tags")
+    story = relationship("Story", backref=backref("tags", passive_deletes=True))
     tagged_user = relationship("User", backref="story_tags")
 
 class StoryOverlay(Base):
     __tablename__ = "story_overlays"
 
     id = Column(Integer, primary_key=True, index=True)
-    story_id = Column(Integer, ForeignKey("stories.id"), nullable=False)
+    story_id = Column(Integer, ForeignKey("stories.id", ondelete="CASCADE"), nullable=False)
     overlay_type = Column(String(20), nullable=False)  # text, emoji, sticker, drawing
     content = Column(Text)  # Texto ou dados do overlay
     position_x = Column(Integer, default=50)  # Posição X em percentual
@@ -65,4 +91,4 @@ class StoryOverlay(Base):
     font_size = Column(Integer, default=16)  # Tamanho da fonte
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    story = relationship("Story", backref="overlays")
+    story = relationship("Story", backref=backref("overlays", passive_deletes=True))
@@ -0,0 +1,28 @@
+"""
+Modelos da timeline materializada (fan-out on write)
+"""
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, UniqueConstraint
+from datetime import datetime
+from core.database import Base
+
+class TimelineEntry(Base):
+    """Post entregue na timeline de um usuário no momento da criação"""
+    __tablename__ = "timeline_entries"
+    __table_args__ = (
+        UniqueConstraint("user_id", "post_id", name="uq_timeline_entries_user_id_post_id"),
+        Index("ix_timeline_entries_user_id_created_at_post_id", "user_id", "created_at", "post_id"),
+        Index("ix_timeline_entries_post_id", "post_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, nullable=False)  # Cópia de Post.created_at, para paginar pelo índice
+
+class TimelinePullAuthor(Base):
+    """Autor com audiência grande demais para fan-out; seus posts são lidos na hora"""
+    __tablename__ = "timeline_pull_authors"
+
+    author_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    marked_at = Column(DateTime, default=datetime.utcnow)
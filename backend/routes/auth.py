@@ -3,12 +3,15 @@ Rotas de autenticação
 """
 from fastapi import APIRouter, HTTPException, Depends, status, Request
 from fastapi.responses import JSONResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta, datetime
 
-from core.database import get_db
-from core.security import hash_password, verify_password, create_access_token, get_current_user
+from core.database import get_db, get_async_db
+from core.security import hash_password, verify_password, create_access_token, get_current_user_async
 from core.security_middleware import security_middleware
+from core.performance_middleware import tag_response, invalidate_cache_tags
 from core.config import ACCESS_TOKEN_EXPIRE_MINUTES
 from models import User
 from schemas import LoginRequest, Token, UserCreate, UserResponse
@@ -42,7 +45,7 @@ def test_database_connection(db: Session = Depends(get_db)):
         }
 
 @router.post("/register")
-async def register(request: Request, user: UserCreate, db: Session = Depends(get_db)):
+async def register(request: Request, user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Verificações de segurança
     security_response = await security_middleware.process_request(request)
     if security_response:
@@ -79,7 +82,7 @@ async def register(request: Request, user: UserCreate, db: Session = Depends(get
         print(f"✅ Required fields validated")
 
         # Verifica se o usuário já existe
-        db_user = db.query(User).filter(User.email == user.email).first()
+        db_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
         if db_user:
             print(f"❌ Email already registered: {user.email}")
             raise HTTPException(status_code=400, detail="Email already registered")
@@ -119,8 +122,8 @@ async def register(request: Request, user: UserCreate, db: Session = Depends(get
 
         # Save to database
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
 
         print(f"✅ User {db_user.id} created successfully!")
 
@@ -141,11 +144,11 @@ async def register(request: Request, user: UserCreate, db: Session = Depends(get
         raise
     except Exception as e:
         print(f"❌ Unexpected error: {type(e).__name__}: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {str(e)}")
 
 @router.post("/login", response_model=Token)
-async def login(request: Request, login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(request: Request, login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     # Verificações de segurança
     security_response = await security_middleware.process_request(request)
     if security_response:
@@ -160,7 +163,7 @@ async def login(request: Request, login_data: LoginRequest, db: Session = Depend
             detail="Muitas tentativas de login falhadas. Tente novamente em 15 minutos."
         )
     try:
-        user = db.query(User).filter(User.email == login_data.email).first()
+        user = (await db.execute(select(User).where(User.email == login_data.email))).scalars().first()
 
         if not user or not verify_password(login_data.password, user.password_hash):
             # Registrar tentativa falhada
@@ -224,37 +227,38 @@ async def login(request: Request, login_data: LoginRequest, db: Session = Depend
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {str(e)}")
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_user_async)):
+    tag_response(f"user:{current_user.id}")
     return current_user
 
 @router.get("/check-email")
-def check_email_exists(email: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == email).first()
+async def check_email_exists(email: str, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User.id).where(User.email == email))).first()
     return {"exists": user is not None}
 
 @router.get("/check-username")
-def check_username_exists(username: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(User).filter(
+async def check_username_exists(username: str, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User.id).where(
         User.username == username,
         User.id != current_user.id  # Exclude current user
-    ).first()
+    ))).first()
     return {"exists": user is not None}
 
 @router.get("/check-username-public")
-def check_username_exists_public(username: str, db: Session = Depends(get_db)):
+async def check_username_exists_public(username: str, db: AsyncSession = Depends(get_async_db)):
     """Public route to check username availability during registration"""
-    user = db.query(User).filter(User.username == username).first()
+    user = (await db.execute(select(User.id).where(User.username == username))).first()
     return {"exists": user is not None}
 
 @router.get("/verify-token")
-async def verify_token(current_user: User = Depends(get_current_user)):
+async def verify_token(current_user: User = Depends(get_current_user_async)):
     return {"valid": True, "user": current_user}
 
 @router.post("/complete-onboarding")
 async def complete_onboarding(
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Marcar o onboarding como completo para o usuário atual"""
     # Verificações de segurança
@@ -267,8 +271,9 @@ async def complete_onboarding(
         current_user.onboarding_completed = True
         current_user.updated_at = datetime.now()
 
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await db.refresh(current_user)
+        invalidate_cache_tags(f"user:{current_user.id}", f"profile:{current_user.id}")
 
         print(f"✅ Usuário {current_user.id} completou o onboarding")
 
@@ -279,7 +284,7 @@ async def complete_onboarding(
         }
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Erro ao completar onboarding para usuário {current_user.id}: {e}")
         raise HTTPException(
             status_code=500,
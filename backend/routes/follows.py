@@ -7,8 +7,11 @@ from datetime import datetime
 
 from core.database import get_db
 from core.security import get_current_user
+from core.performance_middleware import invalidate_cache_tags
 from models import User, Follow, Block
 from utils.notification_helpers import create_follow_notification
+from utils.timeline import refresh_author_in_timeline
+from utils.loaders import follower_profile, followed_profile
 
 router = APIRouter(prefix="/follow", tags=["follow"])
 
@@ -53,7 +56,10 @@ async def follow_user(
     )
     
     db.add(follow)
+    db.flush()
+    refresh_author_in_timeline(db, current_user.id, user_id)
     db.commit()
+    invalidate_cache_tags(f"user:{user_id}", f"user:{current_user.id}", f"timeline:{current_user.id}")
 
     # Criar notificação para o usuário seguido
     await create_follow_notification(
@@ -80,7 +86,10 @@ async def unfollow_user(
         raise HTTPException(status_code=404, detail="Not following this user")
     
     db.delete(follow)
+    db.flush()
+    refresh_author_in_timeline(db, current_user.id, user_id)
     db.commit()
+    invalidate_cache_tags(f"user:{user_id}", f"user:{current_user.id}", f"timeline:{current_user.id}")
     
     return {"message": "User unfollowed successfully"}
 
@@ -107,7 +116,7 @@ async def get_followers(
     db: Session = Depends(get_db)
 ):
     """Obter lista de seguidores"""
-    follows = db.query(Follow).filter(Follow.followed_id == current_user.id).all()
+    follows = db.query(Follow).options(follower_profile()).filter(Follow.followed_id == current_user.id).all()
     
     followers = []
     for follow in follows:
@@ -131,7 +140,7 @@ async def get_following(
     db: Session = Depends(get_db)
 ):
     """Obter lista de usuários que está seguindo"""
-    follows = db.query(Follow).filter(Follow.follower_id == current_user.id).all()
+    follows = db.query(Follow).options(followed_profile()).filter(Follow.follower_id == current_user.id).all()
     
     following = []
     for follow in follows:
@@ -161,7 +170,7 @@ async def get_user_followers(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    follows = db.query(Follow).filter(Follow.followed_id == user_id).all()
+    follows = db.query(Follow).options(follower_profile()).filter(Follow.followed_id == user_id).all()
     
     followers = []
     for follow in follows:
@@ -191,7 +200,7 @@ async def get_user_following(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    follows = db.query(Follow).filter(Follow.follower_id == user_id).all()
+    follows = db.query(Follow).options(followed_profile()).filter(Follow.follower_id == user_id).all()
     
     following = []
     for follow in follows:
@@ -8,9 +8,12 @@ from datetime import datetime
 
 from core.database import get_db
 from core.security import get_current_user
+from core.performance_middleware import invalidate_cache_tags
 from models import User, Friendship, Block
 from schemas import UserResponse
+from utils.loaders import friendship_profiles
 from utils.notification_helpers import create_friend_request_notification, create_friend_request_accepted_notification
+from utils.timeline import refresh_relationship_timelines
 
 router = APIRouter(prefix="/friendships", tags=["friendships"])
 
@@ -133,7 +136,13 @@ async def accept_friend_request(
     
     friendship.status = "accepted"
     friendship.updated_at = datetime.utcnow()
+    db.flush()
+    refresh_relationship_timelines(db, friendship.requester_id, current_user.id)
     db.commit()
+    invalidate_cache_tags(
+        f"user:{friendship.requester_id}", f"user:{current_user.id}",
+        f"timeline:{friendship.requester_id}", f"timeline:{current_user.id}"
+    )
 
     # Criar notificação para quem enviou a solicitação
     await create_friend_request_accepted_notification(
@@ -173,7 +182,7 @@ async def get_friends(
     db: Session = Depends(get_db)
 ):
     """Obter lista de amigos"""
-    friendships = db.query(Friendship).filter(
+    friendships = db.query(Friendship).options(*friendship_profiles()).filter(
         ((Friendship.requester_id == current_user.id) | (Friendship.addressee_id == current_user.id)),
         Friendship.status == "accepted"
     ).all()
@@ -212,7 +221,13 @@ async def remove_friend(
         raise HTTPException(status_code=404, detail="Friendship not found")
     
     db.delete(friendship)
+    db.flush()
+    refresh_relationship_timelines(db, friend_id, current_user.id)
     db.commit()
+    invalidate_cache_tags(
+        f"user:{friend_id}", f"user:{current_user.id}",
+        f"timeline:{friend_id}", f"timeline:{current_user.id}"
+    )
     
     return {"message": "Friend removed successfully"}
 
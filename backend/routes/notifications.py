@@ -2,14 +2,16 @@
 Rotas para gerenciamento de notificações
 """
 from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 import json
 
-from core.database import get_db
-from core.security import get_current_user
+from core.database import get_async_db
+from core.security import get_current_user_async
 from models import User, Notification, NotificationType
+from utils.loaders import notification_sender
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
@@ -19,24 +21,24 @@ async def get_notifications(
     limit: int = Query(20, ge=1, le=50),
     unread_only: bool = Query(False),
     notification_type: Optional[str] = Query(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter notificações do usuário"""
-    query = db.query(Notification).filter(
+    query = select(Notification).options(notification_sender()).where(
         Notification.recipient_id == current_user.id,
         Notification.is_deleted == False
     )
     
     if unread_only:
-        query = query.filter(Notification.is_read == False)
+        query = query.where(Notification.is_read == False)
     
     if notification_type:
-        query = query.filter(Notification.notification_type == notification_type)
+        query = query.where(Notification.notification_type == notification_type)
     
-    notifications = query.order_by(
+    notifications = (await db.execute(query.order_by(
         Notification.created_at.desc()
-    ).offset(skip).limit(limit).all()
+    ).offset(skip).limit(limit))).scalars().all()
     
     result = []
     for notification in notifications:
@@ -68,29 +70,29 @@ async def get_notifications(
 
 @router.get("/count")
 async def get_notification_count(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter contagem de notificações não lidas"""
-    unread_count = db.query(Notification).filter(
+    unread_count = await db.scalar(select(func.count()).select_from(Notification).where(
         Notification.recipient_id == current_user.id,
         Notification.is_read == False,
         Notification.is_deleted == False
-    ).count()
+    ))
     
     return {"unread_count": unread_count}
 
 @router.post("/{notification_id}/read")
 async def mark_notification_as_read(
     notification_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Marcar notificação como lida"""
-    notification = db.query(Notification).filter(
+    notification = (await db.execute(select(Notification).where(
         Notification.id == notification_id,
         Notification.recipient_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
@@ -98,21 +100,21 @@ async def mark_notification_as_read(
     if not notification.is_read:
         notification.is_read = True
         notification.read_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
     
     return {"message": "Notification marked as read"}
 
 @router.post("/{notification_id}/click")
 async def mark_notification_as_clicked(
     notification_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Marcar notificação como clicada"""
-    notification = db.query(Notification).filter(
+    notification = (await db.execute(select(Notification).where(
         Notification.id == notification_id,
         Notification.recipient_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
@@ -126,58 +128,58 @@ async def mark_notification_as_clicked(
             notification.is_read = True
             notification.read_at = datetime.utcnow()
         
-        db.commit()
+        await db.commit()
     
     return {"message": "Notification marked as clicked"}
 
 @router.post("/mark-all-read")
 async def mark_all_notifications_as_read(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Marcar todas as notificações como lidas"""
-    db.query(Notification).filter(
+    await db.execute(update(Notification).where(
         Notification.recipient_id == current_user.id,
         Notification.is_read == False,
         Notification.is_deleted == False
-    ).update({
-        "is_read": True,
-        "read_at": datetime.utcnow()
-    })
+    ).values(
+        is_read=True,
+        read_at=datetime.utcnow()
+    ))
     
-    db.commit()
+    await db.commit()
     return {"message": "All notifications marked as read"}
 
 @router.delete("/{notification_id}")
 async def delete_notification(
     notification_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Deletar notificação"""
-    notification = db.query(Notification).filter(
+    notification = (await db.execute(select(Notification).where(
         Notification.id == notification_id,
         Notification.recipient_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     
     notification.is_deleted = True
-    db.commit()
+    await db.commit()
     
     return {"message": "Notification deleted"}
 
 @router.delete("/clear-all")
 async def clear_all_notifications(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Limpar todas as notificações"""
-    db.query(Notification).filter(
+    await db.execute(update(Notification).where(
         Notification.recipient_id == current_user.id,
         Notification.is_deleted == False
-    ).update({"is_deleted": True})
+    ).values(is_deleted=True))
     
-    db.commit()
+    await db.commit()
     return {"message": "All notifications cleared"}
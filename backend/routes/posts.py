@@ -1,21 +1,34 @@
 """
 Rotas de posts, reações e comentários
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, Header
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Callable, List, Optional, Tuple
+from functools import partial
 import json
 
-from core.database import get_db
-from core.security import get_current_user
-from models import User, Post, Reaction, Comment, Share
-from schemas import PostCreate, PostResponse, ReactionCreate, CommentCreate, CommentResponse, ShareCreate
+from core.database import get_async_db
+from core.security import get_current_user_async
+from core.config import POSTS_PAGE_SIZE, POSTS_MAX_PAGE_SIZE, COMMENTS_PAGE_SIZE, COMMENTS_MAX_PAGE_SIZE
+from core.performance_middleware import tag_response, invalidate_cache_tags
+from models import User, Post, Comment
+from schemas import PostCreate, PostResponse, ReactionCreate, CommentCreate, CommentResponse, ShareCreate, InteractionCreate, InteractionBatch
 from utils.notification_helpers import create_post_reaction_notification, create_post_comment_notification
+from utils.counters import reaction_breakdown, top_reactions, reply_counts
+from utils.deletion import delete_post_rows
+from utils.idempotency import IDEMPOTENCY_KEY_HEADER, claim_idempotency_key, save_idempotent_response
+from utils.interactions import upsert_reaction, remove_reaction, add_comment
+from utils.loaders import post_author, comment_author
+from utils.pagination import paginate_by_created_at, split_page
+from utils.timeline import fan_out_post, post_timeline_tags, materialized_timeline_query, pull_authors_query, pulled_timeline_query, merge_timeline_pages
+from utils.viewer_state import resolve_post_viewer_state
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
 @router.post("/", response_model=PostResponse)
-async def create_post(post: PostCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_post(post: PostCreate, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
     # Validação e processamento do conteúdo
     content_to_save = post.content
     
@@ -42,16 +55,22 @@ async def create_post(post: PostCreate, current_user: User = Depends(get_current
         is_cover_update=post.is_cover_update
     )
     db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
+    await db.flush()
+    # Entregar o post nas timelines da audiência na mesma transação
+    await db.run_sync(fan_out_post, db_post)
+    timeline_tags = await db.run_sync(post_timeline_tags, db_post)
+    await db.commit()
+    await db.refresh(db_post)
+    # Só as timelines que recebem o post (e o perfil e a listagem de posts do autor) saem do cache
+    invalidate_cache_tags(f"user:{current_user.id}", *timeline_tags)
     
     return PostResponse(
         id=db_post.id,
         author={
-            "id": db_post.author.id,
-            "first_name": db_post.author.first_name,
-            "last_name": db_post.author.last_name,
-            "avatar": getattr(db_post.author, 'avatar', None)
+            "id": current_user.id,
+            "first_name": current_user.first_name,
+            "last_name": current_user.last_name,
+            "avatar": getattr(current_user, 'avatar', None)
         },
         content=db_post.content,
         post_type=db_post.post_type,
@@ -66,8 +85,32 @@ async def create_post(post: PostCreate, current_user: User = Depends(get_current
     )
 
 @router.get("/", response_model=List[PostResponse])
-async def get_posts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    posts = db.query(Post).order_by(Post.created_at.desc()).limit(50).all()
+async def get_posts(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(POSTS_PAGE_SIZE, ge=1, le=POSTS_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Timeline do usuário paginada por cursor (o cursor da próxima página vem no
+    header X-Next-Cursor): entradas materializadas no fan-out mescladas com os
+    posts de autores sem fan-out
+    """
+    materialized = (await db.execute(materialized_timeline_query(current_user.id, cursor, limit))).scalars().all()
+    pull_author_ids = (await db.execute(pull_authors_query(current_user.id))).scalars().all()
+    pulled = (await db.execute(
+        pulled_timeline_query(current_user.id, pull_author_ids, cursor, limit)
+    )).scalars().all() if pull_author_ids else []
+    posts = split_page(merge_timeline_pages(materialized, pulled), limit, response)
+    reactions, friend_ids = await db.run_sync(resolve_post_viewer_state, current_user.id, posts)
+    breakdown = await db.run_sync(reaction_breakdown, [post.id for post in posts])
+    # author_posts: novos posts de autores sem fan-out não passam por timeline:{id};
+    # profile: só dados de perfil dos autores, para um post novo não limpar todo feed que mostra o autor
+    tag_response(
+        "posts", f"timeline:{current_user.id}", *(f"author_posts:{author_id}" for author_id in pull_author_ids),
+        *(f"post:{post.id}" for post in posts), *(f"profile:{post.author_id}" for post in posts)
+    )
     
     return [
         PostResponse(
@@ -87,19 +130,28 @@ async def get_posts(current_user: User = Depends(get_current_user), db: Session
             comments_count=post.comments_count,
             shares_count=post.shares_count,
             is_profile_update=post.is_profile_update,
-            is_cover_update=post.is_cover_update
+            is_cover_update=post.is_cover_update,
+            my_reaction=reactions.get(post.id),
+            is_friend=post.author_id in friend_ids,
+            reactions_summary=breakdown.get(post.id, {}),
+            top_reactions=top_reactions(breakdown.get(post.id, {}))
         )
         for post in posts
     ]
 
 @router.get("/{post_id}", response_model=PostResponse)
-async def get_post(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_post(post_id: int, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
     """Get individual post by ID"""
-    post = db.query(Post).filter(Post.id == post_id).first()
+    result = await db.execute(select(Post).options(post_author()).where(Post.id == post_id))
+    post = result.scalars().first()
 
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
+    tag_response(f"post:{post.id}", f"profile:{post.author_id}")
+    reactions, friend_ids = await db.run_sync(resolve_post_viewer_state, current_user.id, [post])
+    breakdown = await db.run_sync(reaction_breakdown, [post.id])
+
     return PostResponse(
         id=post.id,
         author={
@@ -113,150 +165,280 @@ async def get_post(post_id: int, current_user: User = Depends(get_current_user),
         media_type=post.media_type,
         media_url=post.media_url,
         created_at=post.created_at,
-        reactions_count=db.query(Reaction).filter(Reaction.post_id == post.id).count(),
-        comments_count=db.query(Comment).filter(Comment.post_id == post.id).count(),
-        shares_count=db.query(Share).filter(Share.post_id == post.id).count(),
+        reactions_count=post.reactions_count,
+        comments_count=post.comments_count,
+        shares_count=post.shares_count,
         is_profile_update=post.is_profile_update,
-        is_cover_update=post.is_cover_update
+        is_cover_update=post.is_cover_update,
+        my_reaction=reactions.get(post.id),
+        is_friend=post.author_id in friend_ids,
+        reactions_summary=breakdown.get(post.id, {}),
+        top_reactions=top_reactions(breakdown.get(post.id, {}))
     )
 
 @router.delete("/{post_id}")
-async def delete_post(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    post = db.query(Post).filter(Post.id == post_id).first()
+async def delete_post(post_id: int, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    post = await db.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
     if post.author_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this post")
     
-    # Delete related data
-    db.query(Reaction).filter(Reaction.post_id == post_id).delete()
-    db.query(Comment).filter(Comment.post_id == post_id).delete()
-    db.query(Share).filter(Share.post_id == post_id).delete()
-    
-    db.delete(post)
-    db.commit()
+    # Reações, comentários, compartilhamentos e entradas de timeline saem junto (ON DELETE CASCADE)
+    await db.run_sync(delete_post_rows, post_id)
+    await db.commit()
+    # Timelines em cache que mostram o post têm a tag post:{id}
+    invalidate_cache_tags(f"post:{post_id}", f"user:{current_user.id}")
     
     return {"message": "Post deleted successfully"}
 
 # Reactions
+def apply_reaction(db: Session, user_id: int, post_id: int, reaction_type: str, idempotency_key: Optional[str]) -> Tuple[dict, bool]:
+    """Gravar a reação (parte síncrona); retorna (resultado, reação nova?)"""
+    if idempotency_key:
+        stored = claim_idempotency_key(db, user_id, idempotency_key)
+        if stored is not None:
+            return stored, False
+
+    created = upsert_reaction(db, user_id, post_id, reaction_type)
+    result = {"message": "Reaction added" if created else "Reaction updated"}
+    if idempotency_key:
+        save_idempotent_response(db, user_id, idempotency_key, result)
+    return result, created
+
 @router.post("/{post_id}/reactions")
-async def create_post_reaction(post_id: int, reaction_data: ReactionCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_post_reaction(
+    post_id: int,
+    reaction_data: ReactionCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER, max_length=100),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Add or update reaction to a post"""
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    # Check if user already reacted
-    existing_reaction = db.query(Reaction).filter(
-        Reaction.post_id == post_id,
-        Reaction.user_id == current_user.id
-    ).first()
-
-    if existing_reaction:
-        # Update existing reaction
-        existing_reaction.reaction_type = reaction_data.reaction_type
-        db.commit()
-        return {"message": "Reaction updated"}
-    else:
-        # Create new reaction
-        reaction = Reaction(
+    user_id, post_author_id = current_user.id, post.author_id
+    result, created = await db.run_sync(apply_reaction, user_id, post_id, reaction_data.reaction_type, idempotency_key)
+    await db.commit()
+    invalidate_cache_tags(f"post:{post_id}")
+
+    # Criar notificação para o autor do post (se não for o mesmo usuário)
+    if created and post_author_id != user_id:
+        await create_post_reaction_notification(
+            db=db,
             post_id=post_id,
-            user_id=current_user.id,
+            reactor_id=user_id,
+            post_author_id=post_author_id,
             reaction_type=reaction_data.reaction_type
         )
-        db.add(reaction)
-        db.commit()
-
-        # Criar notificação para o autor do post (se não for o mesmo usuário)
-        if post.author_id != current_user.id:
-            await create_post_reaction_notification(
-                db=db,
-                post_id=post_id,
-                reactor_id=current_user.id,
-                post_author_id=post.author_id,
-                reaction_type=reaction_data.reaction_type
-            )
 
-        return {"message": "Reaction added"}
+    return result
 
 @router.delete("/{post_id}/reactions")
-async def remove_post_reaction(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def remove_post_reaction(post_id: int, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
     """Remove reaction from a post"""
-    reaction = db.query(Reaction).filter(
-        Reaction.post_id == post_id,
-        Reaction.user_id == current_user.id
-    ).first()
-
-    if reaction:
-        db.delete(reaction)
-        db.commit()
-        return {"message": "Reaction removed"}
-    else:
+    if not await db.run_sync(remove_reaction, current_user.id, post_id):
         raise HTTPException(status_code=404, detail="Reaction not found")
 
+    await db.commit()
+    invalidate_cache_tags(f"post:{post_id}")
+    return {"message": "Reaction removed"}
+
 # Comments
+def comment_response(comment: Comment, replies_count: int = 0) -> CommentResponse:
+    return CommentResponse(
+        id=comment.id,
+        content=comment.content,
+        author={
+            "id": comment.author.id,
+            "first_name": comment.author.first_name,
+            "last_name": comment.author.last_name,
+            "avatar": getattr(comment.author, 'avatar', None)
+        },
+        created_at=comment.created_at,
+        reactions_count=0,
+        parent_id=comment.parent_id,
+        replies_count=replies_count
+    )
+
+async def comment_page(db: AsyncSession, query, cursor: Optional[str], limit: int, response: Response) -> List[CommentResponse]:
+    """Página de comentários em ordem cronológica, com o número de respostas de cada um"""
+    result = await db.execute(paginate_by_created_at(query.options(comment_author()), Comment, cursor, limit, ascending=True))
+    comments = split_page(result.scalars().all(), limit, response)
+    counts = await db.run_sync(reply_counts, [comment.id for comment in comments])
+    tag_response(*(f"profile:{comment.author_id}" for comment in comments))
+    return [comment_response(comment, counts.get(comment.id, 0)) for comment in comments]
+
 @router.get("/{post_id}/comments", response_model=List[CommentResponse])
-async def get_post_comments(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get comments for a specific post"""
-    post = db.query(Post).filter(Post.id == post_id).first()
+async def get_post_comments(
+    post_id: int,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(COMMENTS_PAGE_SIZE, ge=1, le=COMMENTS_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Comentários de primeiro nível do post, paginados por cursor (header
+    X-Next-Cursor); as respostas são carregadas sob demanda em /replies
+    """
+    post = await db.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    comments = db.query(Comment).filter(Comment.post_id == post_id).order_by(Comment.created_at.asc()).all()
+    tag_response(f"post:{post_id}")
+    query = select(Comment).where(Comment.post_id == post_id, Comment.parent_id.is_(None))
+    return await comment_page(db, query, cursor, limit, response)
 
-    return [
-        CommentResponse(
-            id=comment.id,
-            content=comment.content,
-            author={
-                "id": comment.author.id,
-                "first_name": comment.author.first_name,
-                "last_name": comment.author.last_name,
-                "avatar": getattr(comment.author, 'avatar', None)
-            },
-            created_at=comment.created_at,
-            reactions_count=0
-        )
-        for comment in comments
-    ]
+@router.get("/{post_id}/comments/{comment_id}/replies", response_model=List[CommentResponse])
+async def get_comment_replies(
+    post_id: int,
+    comment_id: int,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(COMMENTS_PAGE_SIZE, ge=1, le=COMMENTS_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Respostas diretas de um comentário, paginadas por cursor"""
+    parent = await db.get(Comment, comment_id)
+    if not parent or parent.post_id != post_id:
+        raise HTTPException(status_code=404, detail="Comment not found")
+
+    tag_response(f"post:{post_id}")
+    query = select(Comment).where(Comment.parent_id == comment_id)
+    return await comment_page(db, query, cursor, limit, response)
+
+def apply_comment(db: Session, user_id: int, post_id: int, content: str, parent_id: Optional[int],
+                  idempotency_key: Optional[str]) -> Tuple[dict, Optional[int]]:
+    """Gravar o comentário (parte síncrona); retorna (resultado, id do comentário novo)"""
+    if idempotency_key:
+        stored = claim_idempotency_key(db, user_id, idempotency_key)
+        if stored is not None:
+            return stored, None
+
+    comment = add_comment(db, user_id, post_id, content, parent_id)
+    result = comment_response(comment).model_dump(mode="json")
+    if idempotency_key:
+        save_idempotent_response(db, user_id, idempotency_key, result)
+    return result, comment.id
 
 @router.post("/{post_id}/comments", response_model=CommentResponse)
-async def create_comment(post_id: int, comment_data: CommentCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_comment(
+    post_id: int,
+    comment_data: CommentCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER, max_length=100),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Create a comment on a post"""
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await db.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    comment = Comment(
-        content=comment_data.content,
-        post_id=post_id,
-        author_id=current_user.id
+    user_id, post_author_id = current_user.id, post.author_id
+    result, comment_id = await db.run_sync(
+        apply_comment, user_id, post_id, comment_data.content, comment_data.parent_id, idempotency_key
     )
-
-    db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
+    invalidate_cache_tags(f"post:{post_id}")
 
     # Criar notificação para o autor do post (se não for o mesmo usuário)
-    if post.author_id != current_user.id:
+    if comment_id is not None and post_author_id != user_id:
         await create_post_comment_notification(
             db=db,
             post_id=post_id,
-            commenter_id=current_user.id,
-            post_author_id=post.author_id,
-            comment_id=comment.id
+            commenter_id=user_id,
+            post_author_id=post_author_id,
+            comment_id=comment_id
         )
 
-    return CommentResponse(
-        id=comment.id,
-        content=comment.content,
-        author={
-            "id": current_user.id,
-            "first_name": current_user.first_name,
-            "last_name": current_user.last_name,
-            "avatar": getattr(current_user, 'avatar', None)
-        },
-        created_at=comment.created_at,
-        reactions_count=0
-    )
+    return result
+
+# Interações em lote (clientes offline enviando a fila acumulada)
+def apply_interaction(db: Session, user_id: int, post: Post, item: InteractionCreate) -> Tuple[dict, Optional[Callable]]:
+    """
+    Executar uma interação do lote; retorna (resultado, notificação a enviar
+    após o commit, chamada com a AsyncSession em db=)
+    """
+    if item.type == "reaction":
+        if not item.reaction_type:
+            raise HTTPException(status_code=400, detail="reaction_type is required")
+        created = upsert_reaction(db, user_id, post.id, item.reaction_type)
+        notify = None
+        if created and post.author_id != user_id:
+            notify = partial(
+                create_post_reaction_notification, post_id=post.id, reactor_id=user_id,
+                post_author_id=post.author_id, reaction_type=item.reaction_type
+            )
+        return {"message": "Reaction added" if created else "Reaction updated"}, notify
+
+    if item.type == "remove_reaction":
+        if not remove_reaction(db, user_id, post.id):
+            raise HTTPException(status_code=404, detail="Reaction not found")
+        return {"message": "Reaction removed"}, None
+
+    if not item.content:
+        raise HTTPException(status_code=400, detail="content is required")
+    comment = add_comment(db, user_id, post.id, item.content, item.parent_id)
+    notify = None
+    if post.author_id != user_id:
+        notify = partial(
+            create_post_comment_notification, post_id=post.id, commenter_id=user_id,
+            post_author_id=post.author_id, comment_id=comment.id
+        )
+    return comment_response(comment).model_dump(mode="json"), notify
+
+def apply_interactions(db: Session, user_id: int, batch: InteractionBatch) -> Tuple[List[dict], List[int], List[Callable]]:
+    """Aplicar o lote (parte síncrona); retorna (resultados, posts alterados, notificações)"""
+    post_ids = {item.post_id for item in batch.interactions}
+    posts = {post.id: post for post in db.query(Post).filter(Post.id.in_(post_ids)).all()}
+
+    results = []
+    notifications = []
+    for index, item in enumerate(batch.interactions):
+        savepoint = db.begin_nested()
+        try:
+            post = posts.get(item.post_id)
+            if not post:
+                raise HTTPException(status_code=404, detail="Post not found")
+
+            stored = claim_idempotency_key(db, user_id, item.idempotency_key) if item.idempotency_key else None
+            if stored is not None:
+                savepoint.rollback()
+                results.append({"index": index, "status": "ok", "result": stored})
+                continue
+
+            result, notify = apply_interaction(db, user_id, post, item)
+            if item.idempotency_key:
+                save_idempotent_response(db, user_id, item.idempotency_key, result)
+            savepoint.commit()
+            results.append({"index": index, "status": "ok", "result": result})
+            if notify:
+                notifications.append(notify)
+        except HTTPException as e:
+            savepoint.rollback()
+            results.append({"index": index, "status": "error", "status_code": e.status_code, "detail": e.detail})
+
+    return results, list(posts), notifications
+
+@router.post("/interactions/batch")
+async def create_interactions_batch(batch: InteractionBatch, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    """
+    Aplicar várias reações/comentários em uma requisição e uma transação.
+
+    Cada item roda em um savepoint: um item inválido não desfaz os outros e
+    volta com status "error". Itens com idempotency_key já aplicada devolvem
+    o resultado original sem repetir a escrita.
+    """
+    results, post_ids, notifications = await db.run_sync(apply_interactions, current_user.id, batch)
+    await db.commit()
+    invalidate_cache_tags(*(f"post:{post_id}" for post_id in post_ids))
+
+    for notify in notifications:
+        await notify(db=db)
+
+    return {"results": results}
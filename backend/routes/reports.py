@@ -7,8 +7,10 @@ from datetime import datetime
 
 from core.database import get_db
 from core.security import get_current_user
+from core.performance_middleware import invalidate_cache_tags
 from models import User
 from models.report import Report, ReportType, ReportStatus
+from utils.timeline import refresh_relationship_timelines
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
@@ -157,7 +159,14 @@ async def block_user(
     if follow2:
         db.delete(follow2)
     
+    # Tirar os posts de um da timeline do outro, nos dois sentidos
+    db.flush()
+    refresh_relationship_timelines(db, current_user.id, user_id)
     db.commit()
+    invalidate_cache_tags(
+        f"user:{user_id}", f"user:{current_user.id}",
+        f"timeline:{user_id}", f"timeline:{current_user.id}"
+    )
     
     return {"message": "User blocked successfully"}
 
@@ -180,6 +189,7 @@ async def unblock_user(
     
     db.delete(block)
     db.commit()
+    invalidate_cache_tags(f"user:{user_id}", f"user:{current_user.id}")
     
     return {"message": "User unblocked successfully"}
 
@@ -1,20 +1,29 @@
 """
 Rotas para stories
 """
-import os
 from typing import List, Optional
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy import DateTime, and_, desc, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.database import get_db
-from models.story import Story, StoryView, StoryTag, StoryOverlay
+from core.database import get_async_db
+from core.security import get_current_user_async
+from core.config import STORIES_TRAY_PAGE_SIZE, STORIES_TRAY_MAX_PAGE_SIZE, STORY_VIEWERS_PAGE_SIZE, STORY_VIEWERS_MAX_PAGE_SIZE
+from core.performance_middleware import tag_response, invalidate_cache_tags
+from models.story import Story, StoryView, ArchivedStoryView
 from models.user import User
 from schemas.story import StoryCreate, StoryResponse, StoryWithEditor
-from utils.auth import get_current_user
 from utils.files import save_uploaded_file
+from utils.deletion import delete_story_rows
+from utils.loaders import story_author, story_viewer
+from utils.media_cleanup import schedule_media_removal
+from utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, keyset_paginate
+from utils.story_archive import live_stories
+from utils.story_tray import live_stories_condition, tray_groups_query, tray_group_cursor, tray_stories_query
+from utils.story_views import record_story_view
+from utils.viewer_state import resolve_story_viewer_state
 
 router = APIRouter(prefix="/stories", tags=["stories"])
 
@@ -25,8 +34,8 @@ async def create_story(
     background_color: Optional[str] = Form("#3B82F6"),
     duration_hours: int = Form(24),
     file: Optional[UploadFile] = File(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Criar uma nova story com upload de mídia opcional"""
 
@@ -67,6 +76,8 @@ async def create_story(
                     elif file.content_type.startswith('audio/'):
                         final_media_type = "audio"
 
+                except HTTPException:
+                    raise
                 except Exception as upload_error:
                     print(f"❌ Erro no upload: {str(upload_error)}")
                     raise HTTPException(status_code=500, detail=f"Erro no upload: {str(upload_error)}")
@@ -89,8 +100,10 @@ async def create_story(
         )
 
         db.add(story)
-        db.commit()
-        db.refresh(story)
+        await db.commit()
+        await db.refresh(story)
+        live_stories.add(story.id, story.expires_at)
+        invalidate_cache_tags("stories", f"user:{current_user.id}")
 
         print(f"✅ Story criada com sucesso - ID: {story.id}")
 
@@ -121,122 +134,209 @@ async def create_story(
 
     except HTTPException as he:
         print(f"❌ HTTPException: {he.detail}")
-        db.rollback()
+        await db.rollback()
         raise he
     except Exception as e:
         print(f"❌ Erro inesperado ao criar story: {str(e)}")
         print(f"   Tipo do erro: {type(e)}")
         import traceback
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+def story_author_data(author: User) -> dict:
+    return {
+        "id": author.id,
+        "first_name": author.first_name,
+        "last_name": author.last_name,
+        "username": author.username,
+        "avatar_url": author.avatar
+    }
+
+def story_data(story: Story, viewed: bool, is_friend: bool) -> dict:
+    return {
+        "id": story.id,
+        "author": story_author_data(story.author),
+        "content": story.content,
+        "media_type": story.media_type,
+        "media_url": story.media_url,
+        "background_color": story.background_color,
+        "created_at": story.created_at.isoformat(),
+        "expires_at": story.expires_at.isoformat(),
+        "views_count": story.views_count,
+        "viewed_by_user": viewed,
+        "is_friend": is_friend
+    }
+
 @router.get("/", response_model=List[dict])
 async def get_stories(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Buscar stories ativas (não expiradas)"""
     
     try:
+        # Nenhuma story ativa conhecida pelo índice em memória: nada a consultar
+        if not await live_stories.any_live(db):
+            return []
+        
+        stories = (await db.execute(
+            select(Story).join(User, Story.author_id == User.id).options(story_author()).where(
+                live_stories_condition(datetime.utcnow())
+            ).order_by(desc(Story.created_at))
+        )).scalars().all()
+        tag_response("stories", *(f"story:{story.id}" for story in stories), *(f"profile:{story.author_id}" for story in stories))
+        
+        # Stories já vistas e amizade com os autores: uma query para a página toda
+        viewed_ids, friend_ids = await db.run_sync(resolve_story_viewer_state, current_user.id, stories)
+        
+        return [
+            story_data(story, story.id in viewed_ids, story.author_id in friend_ids)
+            for story in stories
+        ]
+        
+    except Exception as e:
+        print(f"❌ Erro ao buscar stories: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar stories: {str(e)}")
+
+@router.get("/tray", response_model=List[dict])
+async def get_stories_tray(
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(STORIES_TRAY_PAGE_SIZE, ge=1, le=STORIES_TRAY_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Bandeja de stories agrupada por autor, com grupos não vistos primeiro.
+    Paginada por grupo (cursor da próxima página no header X-Next-Cursor).
+    """
+    
+    try:
+        if not await live_stories.any_live(db):
+            return []
+        
         now = datetime.utcnow()
+        groups = (await db.execute(tray_groups_query(current_user.id, now, cursor, limit))).all()
+        if len(groups) > limit:
+            groups = groups[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = tray_group_cursor(groups[-1])
         
-        # Buscar stories não expiradas
-        stories = db.query(Story).join(User).filter(
-            and_(
-                Story.expires_at > now,
-                Story.archived == False
-            )
-        ).order_by(desc(Story.created_at)).all()
+        author_ids = [group.author_id for group in groups]
+        stories = (await db.execute(tray_stories_query(author_ids, now))).scalars().all() if author_ids else []
+        viewed_ids, friend_ids = await db.run_sync(resolve_story_viewer_state, current_user.id, stories)
+        tag_response("stories", *(f"story:{story.id}" for story in stories), *(f"profile:{author_id}" for author_id in author_ids))
         
-        result = []
+        stories_by_author = {}
         for story in stories:
-            # Verificar se o usuário atual já visualizou esta story
-            viewed = db.query(StoryView).filter(
-                and_(
-                    StoryView.story_id == story.id,
-                    StoryView.viewer_id == current_user.id
-                )
-            ).first() is not None
-            
-            story_data = {
-                "id": story.id,
-                "author": {
-                    "id": story.author.id,
-                    "first_name": story.author.first_name,
-                    "last_name": story.author.last_name,
-                    "username": story.author.username,
-                    "avatar_url": story.author.avatar
-                },
-                "content": story.content,
-                "media_type": story.media_type,
-                "media_url": story.media_url,
-                "background_color": story.background_color,
-                "created_at": story.created_at.isoformat(),
-                "expires_at": story.expires_at.isoformat(),
-                "views_count": story.views_count,
-                "viewed_by_user": viewed
-            }
-            result.append(story_data)
+            stories_by_author.setdefault(story.author_id, []).append(story)
+        
+        result = []
+        for group in groups:
+            author_stories = stories_by_author.get(group.author_id, [])
+            if not author_stories:
+                continue  # Expirou entre as duas queries
+            result.append({
+                "author": story_author_data(author_stories[0].author),
+                "stories": [
+                    story_data(story, story.id in viewed_ids, story.author_id in friend_ids)
+                    for story in author_stories
+                ],
+                "stories_count": group.stories_count,
+                "unseen_count": group.unseen_count,
+                "all_seen": bool(group.all_seen),
+                "latest_story_at": group.latest_at.isoformat(),
+                "is_friend": group.author_id in friend_ids
+            })
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Erro ao buscar stories: {str(e)}")
+        print(f"❌ Erro ao buscar bandeja de stories: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao buscar stories: {str(e)}")
 
 @router.post("/{story_id}/view")
 async def view_story(
     story_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Marcar story como visualizada"""
+    """Marcar story como visualizada (gravação em lote, ver utils/story_views.py)"""
     
     try:
-        # Verificar se a story existe
-        story = db.query(Story).filter(Story.id == story_id).first()
-        if not story:
-            raise HTTPException(status_code=404, detail="Story não encontrada")
-        
-        # Verificar se já foi visualizada
-        existing_view = db.query(StoryView).filter(
-            and_(
-                StoryView.story_id == story_id,
-                StoryView.viewer_id == current_user.id
-            )
-        ).first()
+        # Stories ativas conhecidas pelo índice em memória dispensam a consulta
+        if not live_stories.is_live(story_id):
+            story = await db.get(Story, story_id)
+            if not story:
+                raise HTTPException(status_code=404, detail="Story não encontrada")
         
-        if not existing_view:
-            # Adicionar visualização
-            view = StoryView(
-                story_id=story_id,
-                viewer_id=current_user.id
-            )
-            db.add(view)
-            
-            # Incrementar contador de visualizações
-            story.views_count += 1
-            
-            db.commit()
+        await record_story_view(story_id, current_user.id)
         
         return {"success": True, "message": "Visualização registrada"}
         
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         print(f"❌ Erro ao registrar visualização: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao registrar visualização")
 
+@router.get("/{story_id}/viewers", response_model=List[dict])
+async def get_story_viewers(
+    story_id: int,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(STORY_VIEWERS_PAGE_SIZE, ge=1, le=STORY_VIEWERS_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Quem visualizou a story, mais recentes primeiro (apenas o autor).
+    Paginada por cursor sobre (viewed_at, id), header X-Next-Cursor.
+    """
+    story = await db.get(Story, story_id)
+    if not story:
+        raise HTTPException(status_code=404, detail="Story não encontrada")
+    if story.author_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Apenas o autor pode ver quem visualizou a story")
+    
+    # Stories arquivadas têm as visualizações no armazenamento frio
+    view_model = ArchivedStoryView if story.archived else StoryView
+    # Visualizações antigas podem ter viewed_at NULL: ordenadas como vistas na criação da story
+    viewed_at = func.coalesce(view_model.viewed_at, literal(story.created_at or datetime(1970, 1, 1), DateTime))
+    query = (
+        select(view_model, viewed_at.label("sort_viewed_at"))
+        .options(story_viewer(view_model))
+        .where(view_model.story_id == story_id)
+    )
+    rows = (await db.execute(
+        keyset_paginate(query, viewed_at, view_model.id, cursor, limit)
+    )).all()
+    
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].sort_viewed_at, rows[-1][0].id)
+    views = [row[0] for row in rows]
+    tag_response(f"story:{story_id}", *(f"profile:{view.viewer_id}" for view in views))
+    
+    return [
+        {**story_author_data(view.viewer), "viewed_at": view.viewed_at.isoformat() if view.viewed_at else None}
+        for view in views
+    ]
+
 @router.get("/{story_id}")
 async def get_story(
     story_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Buscar uma story específica"""
     
     try:
-        story = db.query(Story).join(User).filter(Story.id == story_id).first()
+        story = (await db.execute(
+            select(Story).options(story_author()).where(Story.id == story_id)
+        )).scalars().first()
         
         if not story:
             raise HTTPException(status_code=404, detail="Story não encontrada")
@@ -245,15 +345,11 @@ async def get_story(
         if story.expires_at < datetime.utcnow():
             raise HTTPException(status_code=404, detail="Story expirada")
         
+        tag_response(f"story:{story.id}", f"profile:{story.author_id}")
+        
         return {
             "id": story.id,
-            "author": {
-                "id": story.author.id,
-                "first_name": story.author.first_name,
-                "last_name": story.author.last_name,
-                "username": story.author.username,
-                "avatar_url": story.author.avatar
-            },
+            "author": story_author_data(story.author),
             "content": story.content,
             "media_type": story.media_type,
             "media_url": story.media_url,
@@ -270,40 +366,34 @@ async def get_story(
 @router.delete("/{story_id}")
 async def delete_story(
     story_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Deletar uma story (apenas o autor pode deletar)"""
     
     try:
-        story = db.query(Story).filter(
+        story = (await db.execute(select(Story).where(
             and_(
                 Story.id == story_id,
                 Story.author_id == current_user.id
             )
-        ).first()
+        ))).scalars().first()
         
         if not story:
             raise HTTPException(status_code=404, detail="Story não encontrada ou você não tem permissão")
         
-        # Deletar arquivo de mídia se existir
-        if story.media_url:
-            file_path = f"uploads{story.media_url}"
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        
-        # Deletar visualizações e tags relacionadas
-        db.query(StoryView).filter(StoryView.story_id == story_id).delete()
-        db.query(StoryTag).filter(StoryTag.story_id == story_id).delete()
-        db.query(StoryOverlay).filter(StoryOverlay.story_id == story_id).delete()
+        # Deletar a story (visualizações, tags e overlays saem junto via ON DELETE CASCADE)
+        await db.run_sync(delete_story_rows, story_id)
+        await db.commit()
+        live_stories.discard(story_id)
+        invalidate_cache_tags("stories", f"story:{story_id}")
         
-        # Deletar a story
-        db.delete(story)
-        db.commit()
+        # Arquivo de mídia é removido em background, fora do event loop
+        schedule_media_removal(story.media_url)
         
         return {"success": True, "message": "Story deletada com sucesso"}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Erro ao deletar story: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao deletar story")
@@ -10,7 +10,7 @@ from sqlalchemy.orm import Session
 from core.database import get_db
 from models.user import User
 from utils.auth import get_current_user
-from utils.files import save_uploaded_file, validate_media_file
+from utils.files import save_uploaded_file, store_upload, validate_media_file
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
@@ -29,8 +29,10 @@ async def upload_media(
             raise HTTPException(status_code=400, detail=validation_result["error"])
         
         # Salvar arquivo
-        filename = await save_uploaded_file(file, "media")
-        file_path = f"/uploads/media/{filename}"
+        stored = await store_upload(file, "media", "file")
+        # store_upload já devolve a URL pública completa (/uploads/media/...)
+        file_path = stored.url
+        filename = os.path.basename(file_path)
         
         return {
             "success": True,
@@ -42,9 +44,12 @@ async def upload_media(
             "filename": filename,
             "original_filename": file.filename,
             "content_type": file.content_type,
-            "size": file.size if hasattr(file, 'size') else None
+            "size": stored.size,
+            "sha256": stored.sha256
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erro no upload de mídia: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao fazer upload: {str(e)}")
@@ -63,8 +68,7 @@ async def upload_avatar(
             raise HTTPException(status_code=400, detail="Apenas imagens são permitidas para avatar")
         
         # Salvar arquivo
-        filename = await save_uploaded_file(file, "avatars")
-        file_path = f"/uploads/avatars/{filename}"
+        file_path = await save_uploaded_file(file, "avatars")
         
         return {
             "success": True,
@@ -73,6 +77,8 @@ async def upload_avatar(
             "avatar_url": file_path
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erro no upload de avatar: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao fazer upload do avatar: {str(e)}")
@@ -91,8 +97,7 @@ async def upload_cover(
             raise HTTPException(status_code=400, detail="Apenas imagens são permitidas para capa")
         
         # Salvar arquivo
-        filename = await save_uploaded_file(file, "covers")
-        file_path = f"/uploads/covers/{filename}"
+        file_path = await save_uploaded_file(file, "covers")
         
         return {
             "success": True,
@@ -101,6 +106,8 @@ async def upload_cover(
             "cover_url": file_path
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Erro no upload de capa: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao fazer upload da capa: {str(e)}")
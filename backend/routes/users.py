@@ -1,18 +1,24 @@
 """
 Rotas de usuários e perfis
 """
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import os
-import uuid
-from pathlib import Path
 
 from core.database import get_db
 from core.security import get_current_user
+from core.config import POSTS_PAGE_SIZE, POSTS_MAX_PAGE_SIZE
+from core.performance_middleware import tag_response, invalidate_cache_tags
 from models import User, Post, Friendship
 from schemas import UserResponse, PostResponse
 from schemas.user import UserProfileUpdate
+from utils.pagination import paginate_by_created_at, split_page
+from utils.files import save_avatar, save_cover_photo
+from utils.timeline import fan_out_post, post_timeline_tags
+from utils.counters import reaction_breakdown, top_reactions
+from utils.loaders import post_author
+from utils.viewer_state import resolve_post_viewer_state
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -204,6 +210,7 @@ async def get_user_profile(user_id: int, current_user: User = Depends(get_curren
 
     is_friend = friendship is not None
     is_own_profile = current_user.id == user_id
+    tag_response(f"user:{user_id}", f"user:{current_user.id}")
 
     # Calcular estatísticas
     friends_count = db.query(Friendship).filter(
@@ -266,11 +273,22 @@ async def get_user_profile(user_id: int, current_user: User = Depends(get_curren
     return response_data
 
 @router.get("/{user_id}/posts", response_model=List[PostResponse])
-async def get_user_posts(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    posts = db.query(Post).filter(
+async def get_user_posts(
+    user_id: int,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(POSTS_PAGE_SIZE, ge=1, le=POSTS_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    query = db.query(Post).options(post_author()).filter(
         Post.author_id == user_id,
         Post.post_type == "post"
-    ).order_by(Post.created_at.desc()).limit(50).all()
+    )
+    posts = split_page(paginate_by_created_at(query, Post, cursor, limit).all(), limit, response)
+    reactions, friend_ids = resolve_post_viewer_state(db, current_user.id, posts)
+    breakdown = reaction_breakdown(db, [post.id for post in posts])
+    tag_response(f"user:{user_id}", *(f"post:{post.id}" for post in posts))
     
     return [
         PostResponse(
@@ -286,21 +304,35 @@ async def get_user_posts(user_id: int, current_user: User = Depends(get_current_
             media_type=post.media_type,
             media_url=post.media_url,
             created_at=post.created_at,
-            reactions_count=0,
-            comments_count=0,
-            shares_count=0,
+            reactions_count=post.reactions_count,
+            comments_count=post.comments_count,
+            shares_count=post.shares_count,
             is_profile_update=post.is_profile_update,
-            is_cover_update=post.is_cover_update
+            is_cover_update=post.is_cover_update,
+            my_reaction=reactions.get(post.id),
+            is_friend=post.author_id in friend_ids,
+            reactions_summary=breakdown.get(post.id, {}),
+            top_reactions=top_reactions(breakdown.get(post.id, {}))
         )
         for post in posts
     ]
 
 @router.get("/{user_id}/testimonials", response_model=List[PostResponse])
-async def get_user_testimonials(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    testimonials = db.query(Post).filter(
+async def get_user_testimonials(
+    user_id: int,
+    response: Response,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(POSTS_PAGE_SIZE, ge=1, le=POSTS_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    query = db.query(Post).options(post_author()).filter(
         Post.author_id == user_id,
         Post.post_type == "testimonial"
-    ).order_by(Post.created_at.desc()).limit(50).all()
+    )
+    testimonials = split_page(paginate_by_created_at(query, Post, cursor, limit).all(), limit, response)
+    reactions, friend_ids = resolve_post_viewer_state(db, current_user.id, testimonials)
+    breakdown = reaction_breakdown(db, [post.id for post in testimonials])
     
     return [
         PostResponse(
@@ -316,11 +348,15 @@ async def get_user_testimonials(user_id: int, current_user: User = Depends(get_c
             media_type=post.media_type,
             media_url=post.media_url,
             created_at=post.created_at,
-            reactions_count=0,
-            comments_count=0,
-            shares_count=0,
+            reactions_count=post.reactions_count,
+            comments_count=post.comments_count,
+            shares_count=post.shares_count,
             is_profile_update=post.is_profile_update,
-            is_cover_update=post.is_cover_update
+            is_cover_update=post.is_cover_update,
+            my_reaction=reactions.get(post.id),
+            is_friend=post.author_id in friend_ids,
+            reactions_summary=breakdown.get(post.id, {}),
+            top_reactions=top_reactions(breakdown.get(post.id, {}))
         )
         for post in testimonials
     ]
@@ -329,31 +365,11 @@ async def get_user_testimonials(user_id: int, current_user: User = Depends(get_c
 async def upload_user_avatar(file: UploadFile = File(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Upload e definir avatar do usuário"""
     
-    # Validar se é imagem
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-
-    # Validar tamanho (5MB max para avatar)
-    if file.size and file.size > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Image too large (max 5MB)")
-
     try:
-        # Criar diretório se não existe
-        upload_dir = Path("uploads") / "image"
-        upload_dir.mkdir(parents=True, exist_ok=True)
-
-        # Gerar nome único
-        file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-        unique_filename = f"avatar_{current_user.id}_{uuid.uuid4()}{file_extension}"
-        file_path = upload_dir / unique_filename
-
-        # Salvar arquivo
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Validar e salvar arquivo (em blocos, fora do event loop)
+        avatar_url = await save_avatar(file, current_user.id)
 
         # Atualizar avatar do usuário
-        avatar_url = f"/uploads/image/{unique_filename}"
         current_user.avatar = avatar_url
 
         # Criar post automático sobre a atualização da foto de perfil
@@ -368,13 +384,19 @@ async def upload_user_avatar(file: UploadFile = File(...), current_user: User =
             is_profile_update=True
         )
         db.add(profile_post)
+        db.flush()
+        fan_out_post(db, profile_post)
+        timeline_tags = post_timeline_tags(db, profile_post)
         db.commit()
+        invalidate_cache_tags(f"user:{current_user.id}", f"profile:{current_user.id}", *timeline_tags)
 
         return {
             "message": "Avatar updated successfully",
             "avatar_url": avatar_url,
             "post_created": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload avatar: {str(e)}")
 
@@ -382,31 +404,11 @@ async def upload_user_avatar(file: UploadFile = File(...), current_user: User =
 async def upload_user_cover_photo(file: UploadFile = File(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Upload e definir foto de capa do usuário"""
     
-    # Validar se é imagem
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-
-    # Validar tamanho (10MB max para capa)
-    if file.size and file.size > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Image too large (max 10MB)")
-
     try:
-        # Criar diretório se não existe
-        upload_dir = Path("uploads") / "image"
-        upload_dir.mkdir(parents=True, exist_ok=True)
-
-        # Gerar nome único
-        file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-        unique_filename = f"cover_{current_user.id}_{uuid.uuid4()}{file_extension}"
-        file_path = upload_dir / unique_filename
-
-        # Salvar arquivo
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Validar e salvar arquivo (em blocos, fora do event loop)
+        cover_url = await save_cover_photo(file, current_user.id)
 
         # Atualizar foto de capa do usuário
-        cover_url = f"/uploads/image/{unique_filename}"
         current_user.cover_photo = cover_url
 
         # Criar post automático sobre a atualização da foto de capa
@@ -421,13 +423,19 @@ async def upload_user_cover_photo(file: UploadFile = File(...), current_user: Us
             is_cover_update=True
         )
         db.add(cover_post)
+        db.flush()
+        fan_out_post(db, cover_post)
+        timeline_tags = post_timeline_tags(db, cover_post)
         db.commit()
+        invalidate_cache_tags(f"user:{current_user.id}", f"profile:{current_user.id}", *timeline_tags)
 
         return {
             "message": "Cover photo updated successfully",
             "cover_photo_url": cover_url,
             "post_created": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload cover photo: {str(e)}")
 
@@ -480,6 +488,8 @@ async def update_user_profile(
         # Salvar no banco
         db.commit()
         db.refresh(current_user)
+        # profile: nome/avatar do usuário aparecem nos feeds, comentários e stories de outros usuários
+        invalidate_cache_tags(f"user:{current_user.id}", f"profile:{current_user.id}")
 
         print(f"✅ Perfil atualizado com sucesso - ID: {current_user.id}")
 
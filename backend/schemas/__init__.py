@@ -8,7 +8,8 @@ from .user import (
 )
 from .post import (
     PostCreate, PostResponse, ReactionCreate, 
-    CommentCreate, CommentResponse, ShareCreate
+    CommentCreate, CommentResponse, ShareCreate,
+    InteractionCreate, InteractionBatch
 )
 from .story import (
     StoryCreate, StoryResponse, StoryTagCreate,
@@ -29,6 +30,7 @@ __all__ = [
     # Post
     "PostCreate", "PostResponse", "ReactionCreate", 
     "CommentCreate", "CommentResponse", "ShareCreate",
+    "InteractionCreate", "InteractionBatch",
     # Story
     "StoryCreate", "StoryResponse", "StoryTagCreate",
     "StoryOverlayCreate", "StoryWithEditor",
@@ -1,10 +1,16 @@
 """
 Schemas de posts
 """
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 
+# Reações oferecidas pelos seletores do frontend (cabem em Reaction.reaction_type, String(20))
+ReactionType = Literal[
+    "like", "love", "haha", "wow", "sad", "angry", "care", "pride", "grateful", "celebrating",
+    "amei", "triste", "uau", "grr", "nojinho", "apaixonado"
+]
+
 class PostCreate(BaseModel):
     content: str
     post_type: str = "post"
@@ -28,13 +34,17 @@ class PostResponse(BaseModel):
     shares_count: int
     is_profile_update: Optional[bool] = False
     is_cover_update: Optional[bool] = False
+    my_reaction: Optional[str] = None  # Reação do usuário logado
+    is_friend: Optional[bool] = False  # Autor é amigo do usuário logado
+    reactions_summary: Dict[str, int] = {}  # Quantidade por tipo de reação
+    top_reactions: List[str] = []  # Até 3 tipos mais usados
     
     class Config:
         from_attributes = True
 
 class ReactionCreate(BaseModel):
     post_id: int
-    reaction_type: str
+    reaction_type: ReactionType
 
 class CommentCreate(BaseModel):
     content: str
@@ -47,10 +57,24 @@ class CommentResponse(BaseModel):
     author: Dict[str, Any]
     created_at: datetime
     reactions_count: int = 0
+    parent_id: Optional[int] = None
+    replies_count: int = 0  # Respostas diretas (carregadas por /comments/{id}/replies)
     replies: List['CommentResponse'] = []
     
     class Config:
         from_attributes = True
 
+class InteractionCreate(BaseModel):
+    """Interação enfileirada pelo cliente (reação, remoção de reação ou comentário)"""
+    type: Literal["reaction", "remove_reaction", "comment"]
+    post_id: int
+    reaction_type: Optional[ReactionType] = None
+    content: Optional[str] = None
+    parent_id: Optional[int] = None
+    idempotency_key: Optional[str] = Field(None, max_length=100)
+
+class InteractionBatch(BaseModel):
+    interactions: List[InteractionCreate] = Field(..., min_length=1, max_length=100)
+
 class ShareCreate(BaseModel):
     post_id: int
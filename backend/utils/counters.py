@@ -0,0 +1,147 @@
+"""
+Contadores desnormalizados dos posts (reações, comentários, compartilhamentos)
+
+As rotas alteram os contadores com UPDATE atômico (coluna = coluna + n) na
+mesma transação da escrita, sem ler o valor antes. Uma tarefa periódica
+recalcula os contadores a partir das tabelas e corrige divergências.
+"""
+import asyncio
+from typing import Dict, Iterable, List
+from sqlalchemy import select, update, func, case, or_
+from sqlalchemy.orm import Session
+
+from core.config import COUNTER_RECONCILE_INTERVAL_SECONDS, COUNTER_RECONCILE_BATCH_SIZE
+from core.database import SessionLocal
+from core.performance_middleware import invalidate_cache_tags
+from models import Post, Reaction, Comment, Share
+
+# Contador -> tabela cujas linhas ele conta
+POST_COUNTERS = {
+    "reactions_count": Reaction,
+    "comments_count": Comment,
+    "shares_count": Share,
+}
+
+def change_post_counter(post_id: int, counter: str, delta: int):
+    """
+    UPDATE atômico de um contador do post (nunca fica negativo).
+
+    Executar na mesma sessão/transação da escrita: `db.execute(...)` ou
+    `await db.execute(...)`.
+    """
+    column = getattr(Post, counter)
+    current = func.coalesce(column, 0)
+    new_value = current + delta if delta > 0 else case((current + delta > 0, current + delta), else_=0)
+    return (
+        update(Post)
+        .where(Post.id == post_id)
+        .values({counter: new_value})
+        .execution_options(synchronize_session=False)
+    )
+
+# Tipos de reação exibidos no resumo de cada post
+TOP_REACTIONS_LIMIT = 3
+
+def reaction_breakdown(db: Session, post_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+    """post_id -> {tipo de reação: quantidade}, com um único GROUP BY para a página"""
+    post_ids = set(post_ids)
+    if not post_ids:
+        return {}
+    rows = db.execute(
+        select(Reaction.post_id, Reaction.reaction_type, func.count())
+        .where(Reaction.post_id.in_(post_ids))
+        .group_by(Reaction.post_id, Reaction.reaction_type)
+    )
+    breakdown: Dict[int, Dict[str, int]] = {}
+    for post_id, reaction_type, count in rows:
+        breakdown.setdefault(post_id, {})[reaction_type] = count
+    return breakdown
+
+def top_reactions(summary: Dict[str, int]) -> List[str]:
+    """Tipos mais usados (empate desempatado pelo nome, para ordem estável)"""
+    ranked = sorted(summary.items(), key=lambda item: (-item[1], item[0]))
+    return [reaction_type for reaction_type, _ in ranked[:TOP_REACTIONS_LIMIT]]
+
+def reply_counts(db: Session, comment_ids: Iterable[int]) -> Dict[int, int]:
+    """comment_id -> número de respostas diretas, com um único GROUP BY para a página"""
+    comment_ids = set(comment_ids)
+    if not comment_ids:
+        return {}
+    rows = db.execute(
+        select(Comment.parent_id, func.count())
+        .where(Comment.parent_id.in_(comment_ids))
+        .group_by(Comment.parent_id)
+    )
+    return dict(rows.all())
+
+def actual_count(counter: str):
+    """Subquery correlacionada com a contagem real do contador para Post.id"""
+    model = POST_COUNTERS[counter]
+    return select(func.count()).select_from(model).where(model.post_id == Post.id).scalar_subquery()
+
+def reconcile_post_counters(db: Session, batch_size: int = COUNTER_RECONCILE_BATCH_SIZE) -> int:
+    """
+    Corrigir contadores divergentes, percorrendo os posts em lotes por id.
+
+    Retorna quantos posts foram corrigidos. A correção grava a contagem
+    calculada no próprio UPDATE, para não sobrescrever incrementos feitos
+    entre a verificação e a escrita. As respostas em cache com os posts
+    corrigidos (tag post:{id}) são invalidadas a cada lote.
+    """
+    # Contagens reais devem vir do primário, não de uma réplica atrasada
+    db.use_primary = True
+    last_id = 0
+    fixed = 0
+
+    while True:
+        rows = db.execute(
+            select(Post.id, or_(*(
+                func.coalesce(getattr(Post, counter), 0) != actual_count(counter)
+                for counter in POST_COUNTERS
+            )).label("drifted"))
+            .where(Post.id > last_id)
+            .order_by(Post.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        drifted_ids = [row.id for row in rows if row.drifted]
+        if drifted_ids:
+            db.execute(
+                update(Post)
+                .where(Post.id.in_(drifted_ids))
+                .values({counter: actual_count(counter) for counter in POST_COUNTERS})
+                .execution_options(synchronize_session=False)
+            )
+            fixed += len(drifted_ids)
+        db.commit()
+        if drifted_ids:
+            invalidate_cache_tags(*(f"post:{post_id}" for post_id in drifted_ids))
+        last_id = rows[-1].id
+
+    return fixed
+
+def _run_reconciliation() -> int:
+    db = SessionLocal()
+    try:
+        return reconcile_post_counters(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def reconcile_counters_task():
+    """Task para reconciliação periódica dos contadores"""
+    while True:
+        await asyncio.sleep(COUNTER_RECONCILE_INTERVAL_SECONDS)
+        try:
+            fixed = await asyncio.to_thread(_run_reconciliation)
+            if fixed:
+                print(f"🔢 Contadores de {fixed} posts corrigidos")
+        except Exception as e:
+            print(f"⚠️ Erro ao reconciliar contadores: {e}")
+
+def start_counter_reconciliation():
+    asyncio.create_task(reconcile_counters_task())
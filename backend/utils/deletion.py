@@ -0,0 +1,52 @@
+"""
+Exclusão de posts e stories com seus dependentes
+
+Os models declaram ON DELETE CASCADE; com o schema do banco atualizado
+(maintenance/add_cascade_foreign_keys.py) um único DELETE apaga o post ou
+a story e o banco remove reações, comentários, visualizações etc. Enquanto
+a migração não roda, os dependentes são apagados explicitamente na mesma
+transação. Em sessões assíncronas use `await db.run_sync(delete_post_rows, post_id)`.
+"""
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from models import (
+    Post, Reaction, Comment, Share, Notification, TimelineEntry,
+    Story, StoryView, ArchivedStoryView, StoryTag, StoryOverlay
+)
+
+# Tabelas que dependem do post / da story (coluna da chave estrangeira)
+POST_DEPENDENTS = (TimelineEntry.post_id, Reaction.post_id, Comment.post_id, Share.post_id, Notification.post_id)
+STORY_DEPENDENTS = (StoryView.story_id, ArchivedStoryView.story_id, StoryTag.story_id, StoryOverlay.story_id)
+
+# Definido na inicialização por core.schema_check.check_declared_cascades
+_database_cascades = False
+
+def set_database_cascades(enabled: bool):
+    global _database_cascades
+    _database_cascades = enabled
+
+def _delete_dependents(db: Session, columns, parent_id: int):
+    for column in columns:
+        db.execute(delete(column.table).where(column == parent_id))
+
+def delete_post_rows(db: Session, post_id: int) -> int:
+    """Apagar o post e seus dependentes (sem commit). Retorna quantos posts foram apagados"""
+    if not _database_cascades:
+        # Respostas referenciam outros comentários do post: soltar antes de apagar
+        db.execute(
+            update(Comment).where(Comment.post_id == post_id, Comment.parent_id.is_not(None))
+            .values(parent_id=None).execution_options(synchronize_session=False)
+        )
+        _delete_dependents(db, POST_DEPENDENTS, post_id)
+    return db.execute(
+        delete(Post).where(Post.id == post_id).execution_options(synchronize_session=False)
+    ).rowcount
+
+def delete_story_rows(db: Session, story_id: int) -> int:
+    """Apagar a story e seus dependentes (sem commit). Retorna quantas stories foram apagadas"""
+    if not _database_cascades:
+        _delete_dependents(db, STORY_DEPENDENTS, story_id)
+    return db.execute(
+        delete(Story).where(Story.id == story_id).execution_options(synchronize_session=False)
+    ).rowcount
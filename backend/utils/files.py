@@ -1,11 +1,15 @@
 """
 File handling utilities
 """
+import asyncio
+import hashlib
 import os
+import tempfile
 import uuid
 from pathlib import Path
+from typing import BinaryIO, NamedTuple, Tuple
 from fastapi import HTTPException, UploadFile
-from core.config import UPLOAD_DIR, MAX_FILE_SIZE_MB, MAX_AVATAR_SIZE_MB, MAX_COVER_SIZE_MB
+from core.config import UPLOAD_DIR, MAX_FILE_SIZE_MB, MAX_AVATAR_SIZE_MB, MAX_COVER_SIZE_MB, UPLOAD_CHUNK_SIZE
 
 def validate_image_file(file: UploadFile, max_size_mb: int = MAX_FILE_SIZE_MB):
     """Validate uploaded image file"""
@@ -41,61 +45,83 @@ def validate_media_file(file: UploadFile):
 
     return {"valid": True, "file_type": file_type}
 
-async def save_uploaded_file(file: UploadFile, file_type: str, prefix: str = "file") -> str:
-    """Save uploaded file and return file_url"""
-    # Create directory if it doesn't exist
+class StoredFile(NamedTuple):
+    """File stored under UPLOAD_DIR"""
+    url: str
+    size: int
+    sha256: str
+
+def _current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# Read once at import: os.umask can only be read by setting it, which is not thread-safe
+_UMASK = _current_umask()
+
+def _copy_to_disk(source: BinaryIO, destination: Path, max_bytes: int) -> Tuple[int, str]:
+    """
+    Copy the upload in UPLOAD_CHUNK_SIZE chunks to a temp file in the same
+    directory, hashing as it goes, then rename it into place.
+    Runs in a worker thread (asyncio.to_thread), off the event loop.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    temp_fd, temp_path = tempfile.mkstemp(dir=destination.parent, prefix=".upload_", suffix=".part")
+    try:
+        with os.fdopen(temp_fd, "wb") as f:
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=400, detail=f"File too large (max {max_bytes // (1024 * 1024)}MB)")
+                hasher.update(chunk)
+                f.write(chunk)
+            # mkstemp creates the file as 0600; give it the usual umask-based
+            # mode so the web server can serve it
+            os.fchmod(f.fileno(), 0o666 & ~_UMASK)
+        # Atomic rename: readers never see a partially written file
+        os.replace(temp_path, destination)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return size, hasher.hexdigest()
+
+async def store_upload(file: UploadFile, file_type: str, filename_prefix: str, max_size_mb: int = MAX_FILE_SIZE_MB) -> StoredFile:
+    """Stream the upload to UPLOAD_DIR/file_type under a unique name without loading it into memory"""
     upload_dir = Path(UPLOAD_DIR) / file_type
     upload_dir.mkdir(parents=True, exist_ok=True)
 
-    # Generate unique filename
     file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{prefix}_{uuid.uuid4()}{file_extension}"
-    file_path = upload_dir / unique_filename
+    unique_filename = f"{filename_prefix}_{uuid.uuid4()}{file_extension}"
 
-    # Save file
     try:
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        await file.seek(0)
+        size, sha256 = await asyncio.to_thread(
+            _copy_to_disk, file.file, upload_dir / unique_filename, max_size_mb * 1024 * 1024
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
-    # Return URL path
-    return f"/{UPLOAD_DIR}/{file_type}/{unique_filename}"
+    return StoredFile(f"/{UPLOAD_DIR}/{file_type}/{unique_filename}", size, sha256)
+
+async def save_uploaded_file(file: UploadFile, file_type: str, prefix: str = "file") -> str:
+    """Save uploaded file and return file_url"""
+    return (await store_upload(file, file_type, prefix)).url
 
 async def save_avatar(file: UploadFile, user_id: int) -> str:
     """Save avatar file and return URL"""
     validate_image_file(file, MAX_AVATAR_SIZE_MB)
-    
-    upload_dir = Path(UPLOAD_DIR) / "image"
-    upload_dir.mkdir(parents=True, exist_ok=True)
-
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"avatar_{user_id}_{uuid.uuid4()}{file_extension}"
-    file_path = upload_dir / unique_filename
-
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
-
-    return f"/{UPLOAD_DIR}/image/{unique_filename}"
+    return (await store_upload(file, "image", f"avatar_{user_id}", MAX_AVATAR_SIZE_MB)).url
 
 async def save_cover_photo(file: UploadFile, user_id: int) -> str:
     """Save cover photo and return URL"""
     validate_image_file(file, MAX_COVER_SIZE_MB)
-    
-    upload_dir = Path(UPLOAD_DIR) / "image"
-    upload_dir.mkdir(parents=True, exist_ok=True)
-
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"cover_{user_id}_{uuid.uuid4()}{file_extension}"
-    file_path = upload_dir / unique_filename
-
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
-
-    return f"/{UPLOAD_DIR}/image/{unique_filename}"
+    return (await store_upload(file, "image", f"cover_{user_id}", MAX_COVER_SIZE_MB)).url
 
 def ensure_upload_directories():
     """Ensure all upload directories exist"""
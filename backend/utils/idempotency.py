@@ -0,0 +1,89 @@
+"""
+Chaves de idempotência para escritas repetidas pelo cliente
+
+O cliente envia o header Idempotency-Key (ou idempotency_key em cada item do
+lote). A chave é reservada com INSERT IGNORE na mesma transação da escrita;
+se já existir, a escrita não é refeita e a resposta original é devolvida.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.orm import Session
+
+from fastapi import HTTPException
+from core.config import IDEMPOTENCY_KEY_TTL_HOURS
+from core.database import SessionLocal
+from models import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+def claim_idempotency_key(db: Session, user_id: int, key: str) -> Optional[dict]:
+    """
+    Reservar a chave para a escrita atual.
+
+    Retorna None se a chave é nova (seguir com a escrita) ou a resposta
+    original se a chave já foi usada pelo usuário.
+    """
+    result = db.execute(
+        insert(IdempotencyKey)
+        .values(user_id=user_id, key=key, created_at=datetime.utcnow())
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+    if result.rowcount:
+        return None
+
+    # Leitura com lock: enxerga a resposta gravada por uma transação concorrente já commitada
+    existing = db.execute(
+        select(IdempotencyKey.id, IdempotencyKey.response)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .with_for_update()
+    ).first()
+    if existing is None:
+        # O IGNORE do MySQL também engole erros que não são de chave duplicada
+        raise HTTPException(status_code=500, detail="Could not reserve idempotency key")
+    if existing.response is None:
+        raise HTTPException(status_code=409, detail="Request with this idempotency key is still being processed")
+    return json.loads(existing.response)
+
+def save_idempotent_response(db: Session, user_id: int, key: str, response: dict):
+    """Guardar a resposta da escrita junto da chave (antes do commit)"""
+    db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(response=json.dumps(response, default=str))
+        .execution_options(synchronize_session=False)
+    )
+
+def purge_expired_idempotency_keys(db: Session) -> int:
+    """Remover chaves mais antigas que IDEMPOTENCY_KEY_TTL_HOURS"""
+    cutoff = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+    result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+    db.commit()
+    return result.rowcount
+
+def _run_purge() -> int:
+    db = SessionLocal()
+    try:
+        return purge_expired_idempotency_keys(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def cleanup_idempotency_keys_task():
+    """Task para limpeza periódica das chaves expiradas"""
+    while True:
+        await asyncio.sleep(3600)  # 1 hora
+        try:
+            purged = await asyncio.to_thread(_run_purge)
+            if purged:
+                print(f"🧹 {purged} chaves de idempotência expiradas removidas")
+        except Exception as e:
+            print(f"⚠️ Erro ao limpar chaves de idempotência: {e}")
+
+def start_idempotency_cleanup():
+    asyncio.create_task(cleanup_idempotency_keys_task())
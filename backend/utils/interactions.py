@@ -0,0 +1,78 @@
+"""
+Escritas de reações e comentários compartilhadas pelas rotas individuais e
+pelo endpoint de lote
+
+Cada função só executa statements na sessão; o commit fica com a rota. Em
+sessões assíncronas use `await db.run_sync(remove_reaction, user_id, post_id)`.
+"""
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import insert, update, delete
+from sqlalchemy.orm import Session
+
+from models import Reaction, Comment
+from utils.counters import change_post_counter
+
+def upsert_reaction(db: Session, user_id: int, post_id: int, reaction_type: str) -> bool:
+    """
+    Criar ou trocar a reação do usuário no post, sem SELECT prévio.
+
+    O índice único (post_id, user_id) resolve toques concorrentes: o INSERT
+    IGNORE só insere uma vez e os demais caem no UPDATE. Retorna True se a
+    reação é nova.
+
+    No MySQL o IGNORE transforma qualquer erro (FK inválida, NOT NULL) em
+    aviso, então um INSERT sem linhas só é tratado como reação existente se
+    o UPDATE encontrar a linha (rowcount conta linhas encontradas, FOUND_ROWS).
+    """
+    now = datetime.utcnow()
+    inserted = db.execute(
+        insert(Reaction)
+        .values(user_id=user_id, post_id=post_id, reaction_type=reaction_type, created_at=now, updated_at=now)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    ).rowcount
+    if inserted:
+        db.execute(change_post_counter(post_id, "reactions_count", 1))
+        return True
+
+    updated = db.execute(
+        update(Reaction)
+        .where(Reaction.user_id == user_id, Reaction.post_id == post_id)
+        .values(reaction_type=reaction_type, updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        raise HTTPException(status_code=409, detail="Reaction could not be saved")
+    return False
+
+def remove_reaction(db: Session, user_id: int, post_id: int) -> bool:
+    """Remover a reação do usuário no post. Retorna False se não havia reação"""
+    deleted = db.execute(
+        delete(Reaction)
+        .where(Reaction.user_id == user_id, Reaction.post_id == post_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if deleted:
+        db.execute(change_post_counter(post_id, "reactions_count", -deleted))
+    return bool(deleted)
+
+def add_comment(db: Session, user_id: int, post_id: int, content: str, parent_id: Optional[int] = None) -> Comment:
+    """Criar comentário (ou resposta, se parent_id for informado) no post"""
+    # Resposta: o comentário pai precisa ser do mesmo post
+    if parent_id is not None:
+        parent = db.get(Comment, parent_id)
+        if not parent or parent.post_id != post_id:
+            raise HTTPException(status_code=400, detail="Invalid parent comment")
+
+    comment = Comment(
+        content=content,
+        post_id=post_id,
+        author_id=user_id,
+        parent_id=parent_id
+    )
+    db.add(comment)
+    db.flush()
+    db.execute(change_post_counter(post_id, "comments_count", 1))
+    return comment
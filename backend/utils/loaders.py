@@ -0,0 +1,48 @@
+"""
+Opções de carregamento compartilhadas para evitar N+1 nas listagens
+
+Relacionamentos many-to-one (autor, remetente, seguidor) são carregados com
+JOIN na mesma query e restritos às colunas que as respostas usam.
+"""
+from sqlalchemy.orm import joinedload
+
+from models import User, Post, Comment, Story, StoryView, Follow, Friendship, Notification
+
+# Campos do usuário exibidos junto de posts, comentários, stories e notificações
+AUTHOR_SUMMARY_FIELDS = (User.id, User.first_name, User.last_name, User.username, User.avatar)
+
+# Campos exibidos nas listas de amigos e seguidores
+PROFILE_SUMMARY_FIELDS = AUTHOR_SUMMARY_FIELDS + (User.bio, User.location, User.is_verified)
+
+def user_summary(relationship, fields=AUTHOR_SUMMARY_FIELDS):
+    """JOIN do relacionamento carregando só os campos de resumo do usuário"""
+    return joinedload(relationship).load_only(*fields)
+
+def post_author():
+    return user_summary(Post.author)
+
+def comment_author():
+    return user_summary(Comment.author)
+
+def story_author():
+    return user_summary(Story.author)
+
+def story_viewer(view_model=StoryView):
+    """Quem visualizou a story (StoryView ou ArchivedStoryView)"""
+    return user_summary(view_model.viewer)
+
+def notification_sender():
+    return user_summary(Notification.sender)
+
+def follower_profile():
+    return user_summary(Follow.follower, PROFILE_SUMMARY_FIELDS)
+
+def followed_profile():
+    return user_summary(Follow.followed, PROFILE_SUMMARY_FIELDS)
+
+def friendship_profiles():
+    """Os dois lados da amizade (o amigo pode estar em qualquer um)"""
+    return (
+        user_summary(Friendship.requester, PROFILE_SUMMARY_FIELDS),
+        user_summary(Friendship.addressee, PROFILE_SUMMARY_FIELDS),
+    )
@@ -0,0 +1,107 @@
+"""
+Fila de operações em arquivos de mídia em background
+
+As rotas e tarefas só enfileiram a operação (remover ou mover para o
+armazenamento frio) depois do commit; o trabalho em disco roda em uma
+thread, fora do event loop. No desligamento a fila é esvaziada.
+"""
+import asyncio
+import os
+import shutil
+from functools import partial
+from pathlib import Path
+from typing import Callable, Optional
+
+from core.config import UPLOAD_DIR
+
+# Subdiretório de UPLOAD_DIR para mídias arquivadas (armazenamento frio)
+ARCHIVE_MEDIA_DIR = "archive"
+
+_media_cleanup_queue: Optional[asyncio.Queue] = None
+_media_cleanup_task: Optional[asyncio.Task] = None
+
+def media_file_path(media_url: str) -> Optional[Path]:
+    """Caminho local de uma URL de mídia salva por utils.files (None se estiver fora de UPLOAD_DIR)"""
+    if "://" in media_url:
+        return None
+    upload_root = Path(UPLOAD_DIR).resolve()
+    relative = media_url.lstrip("/")
+    if relative.startswith(f"{UPLOAD_DIR}/"):
+        relative = relative[len(UPLOAD_DIR) + 1:]
+    path = (upload_root / relative).resolve()
+    if upload_root not in path.parents:
+        return None
+    return path
+
+def archived_media_url(media_url: str) -> Optional[str]:
+    """URL da mídia depois de movida para o armazenamento frio (None se não for arquivo local)"""
+    path = media_file_path(media_url)
+    if path is None:
+        return None
+    relative = path.relative_to(Path(UPLOAD_DIR).resolve())
+    if relative.parts[0] == ARCHIVE_MEDIA_DIR:
+        return None
+    return f"/{UPLOAD_DIR}/{ARCHIVE_MEDIA_DIR}/{relative.as_posix()}"
+
+def _remove_file(path: Path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _move_file(source: Path, destination: Path):
+    if not source.exists():
+        return
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(source), str(destination))
+
+def _enqueue(job: Callable[[], None]):
+    if _media_cleanup_queue is None:
+        # Fila não iniciada (scripts, testes): executar na hora
+        job()
+        return
+    _media_cleanup_queue.put_nowait(job)
+
+def schedule_media_removal(media_url: Optional[str]):
+    """Enfileirar a remoção do arquivo de uma mídia (chamar depois do commit)"""
+    if not media_url:
+        return
+    path = media_file_path(media_url)
+    if path is None:
+        print(f"⚠️ Mídia fora de {UPLOAD_DIR} não removida: {media_url}")
+        return
+    _enqueue(partial(_remove_file, path))
+
+def schedule_media_move(media_url: str, new_media_url: str):
+    """Enfileirar a mudança de um arquivo de mídia para a nova URL (chamar depois do commit)"""
+    source, destination = media_file_path(media_url), media_file_path(new_media_url)
+    if source is None or destination is None:
+        print(f"⚠️ Mídia fora de {UPLOAD_DIR} não movida: {media_url}")
+        return
+    _enqueue(partial(_move_file, source, destination))
+
+async def media_cleanup_worker():
+    """Task que executa as operações enfileiradas"""
+    while True:
+        job = await _media_cleanup_queue.get()
+        try:
+            await asyncio.to_thread(job)
+        except Exception as e:
+            print(f"⚠️ Erro ao processar mídia: {e}")
+        finally:
+            _media_cleanup_queue.task_done()
+
+def start_media_cleanup():
+    global _media_cleanup_queue, _media_cleanup_task
+    _media_cleanup_queue = asyncio.Queue()
+    _media_cleanup_task = asyncio.create_task(media_cleanup_worker())
+
+async def stop_media_cleanup():
+    """Processar o que ainda está na fila e encerrar a task"""
+    global _media_cleanup_queue, _media_cleanup_task
+    if _media_cleanup_task is None:
+        return
+    await _media_cleanup_queue.join()
+    _media_cleanup_task.cancel()
+    _media_cleanup_queue = None
+    _media_cleanup_task = None
@@ -2,6 +2,7 @@
 Utility functions for creating notifications
 """
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import datetime
 import json
@@ -10,7 +11,7 @@ from models import User, Notification, NotificationType
 from utils.websocket_manager import manager
 
 # Utility function to create notifications
-async def create_notification(
+def save_notification(
     db: Session,
     recipient_id: int,
     notification_type: NotificationType,
@@ -22,8 +23,8 @@ async def create_notification(
     story_id: Optional[int] = None,
     friendship_id: Optional[int] = None,
     data: Optional[dict] = None
-):
-    """Criar uma nova notificação e enviar via WebSocket"""
+) -> Optional[dict]:
+    """Gravar a notificação e devolver os dados para envio via WebSocket (parte síncrona)"""
     
     # Verificar se o recipient não é o sender (evitar auto-notificações)
     if sender_id and recipient_id == sender_id:
@@ -57,7 +58,7 @@ async def create_notification(
             "avatar": notification.sender.avatar
         }
     
-    notification_data = {
+    return {
         "id": notification.id,
         "type": notification.notification_type.value,
         "title": notification.title,
@@ -67,8 +68,11 @@ async def create_notification(
         "sender": sender_data,
         "data": json.loads(notification.data) if notification.data else {}
     }
-    
-    # Enviar notificação via WebSocket
+
+async def send_notification(recipient_id: int, notification_data: Optional[dict]):
+    """Enviar notificação já gravada via WebSocket"""
+    if notification_data is None:
+        return
     await manager.send_personal_message(
         message={
             "type": "notification",
@@ -76,8 +80,12 @@ async def create_notification(
         },
         user_id=recipient_id
     )
-    
-    return notification
+
+async def create_notification(db: Session, recipient_id: int, **fields):
+    """Criar uma nova notificação e enviar via WebSocket"""
+    notification_data = save_notification(db, recipient_id, **fields)
+    await send_notification(recipient_id, notification_data)
+    return notification_data
 
 # Friend request notifications
 async def create_friend_request_notification(
@@ -125,17 +133,17 @@ async def create_friend_request_accepted_notification(
     )
 
 # Post interaction notifications
-async def create_post_reaction_notification(
+# (rotas de posts usam AsyncSession: as queries rodam via run_sync, fora do event loop)
+def save_post_reaction_notification(
     db: Session,
     post_id: int,
     reactor_id: int,
     post_author_id: int,
     reaction_type: str
-):
-    """Criar notificação de reação em post"""
+) -> Optional[dict]:
     reactor = db.query(User).filter(User.id == reactor_id).first()
     if not reactor:
-        return
+        return None
     
     reaction_messages = {
         "like": "curtiu seu post",
@@ -148,8 +156,8 @@ async def create_post_reaction_notification(
     
     message = reaction_messages.get(reaction_type, "reagiu ao seu post")
     
-    await create_notification(
-        db=db,
+    return save_notification(
+        db,
         recipient_id=post_author_id,
         sender_id=reactor_id,
         notification_type=NotificationType.POST_REACTION,
@@ -159,20 +167,32 @@ async def create_post_reaction_notification(
         data={"action_url": f"/post/{post_id}", "reaction_type": reaction_type}
     )
 
-async def create_post_comment_notification(
+async def create_post_reaction_notification(
+    db: AsyncSession,
+    post_id: int,
+    reactor_id: int,
+    post_author_id: int,
+    reaction_type: str
+):
+    """Criar notificação de reação em post"""
+    notification_data = await db.run_sync(
+        save_post_reaction_notification, post_id, reactor_id, post_author_id, reaction_type
+    )
+    await send_notification(post_author_id, notification_data)
+
+def save_post_comment_notification(
     db: Session,
     post_id: int,
     commenter_id: int,
     post_author_id: int,
     comment_id: int
-):
-    """Criar notificação de comentário em post"""
+) -> Optional[dict]:
     commenter = db.query(User).filter(User.id == commenter_id).first()
     if not commenter:
-        return
+        return None
     
-    await create_notification(
-        db=db,
+    return save_notification(
+        db,
         recipient_id=post_author_id,
         sender_id=commenter_id,
         notification_type=NotificationType.POST_COMMENT,
@@ -183,6 +203,19 @@ async def create_post_comment_notification(
         data={"action_url": f"/post/{post_id}"}
     )
 
+async def create_post_comment_notification(
+    db: AsyncSession,
+    post_id: int,
+    commenter_id: int,
+    post_author_id: int,
+    comment_id: int
+):
+    """Criar notificação de comentário em post"""
+    notification_data = await db.run_sync(
+        save_post_comment_notification, post_id, commenter_id, post_author_id, comment_id
+    )
+    await send_notification(post_author_id, notification_data)
+
 async def create_follow_notification(
     db: Session,
     follower_id: int,
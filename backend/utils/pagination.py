@@ -0,0 +1,70 @@
+"""
+Keyset (cursor) pagination utilities
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+
+# Header com o cursor da próxima página (ausente na última página)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, item_id: int, **extra) -> str:
+    """Encode an opaque cursor for the position after (created_at, id), plus optional extra sort keys"""
+    payload = json.dumps({"c": created_at.isoformat(), "i": item_id, **extra}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor_with_extra(cursor: str) -> Tuple[datetime, int, dict]:
+    """Decode a cursor produced by encode_cursor, returning the extra sort keys too"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at, item_id = datetime.fromisoformat(payload.pop("c")), int(payload.pop("i"))
+        return created_at, item_id, payload
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor"""
+    created_at, item_id, _ = decode_cursor_with_extra(cursor)
+    return created_at, item_id
+
+def keyset_paginate(query, created_at_column, id_column, cursor: Optional[str], limit: int, ascending: bool = False):
+    """
+    Apply keyset pagination on (created_at_column, id_column), newest first
+    (or oldest first with ascending=True).
+
+    Works with both ORM Query and select() statements. One extra row is
+    fetched so the caller can tell whether there is a next page.
+    """
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        # Forma expandida da comparação de tupla, para o MySQL usar o índice
+        if ascending:
+            query = query.where(or_(
+                created_at_column > created_at,
+                and_(created_at_column == created_at, id_column > item_id)
+            ))
+        else:
+            query = query.where(or_(
+                created_at_column < created_at,
+                and_(created_at_column == created_at, id_column < item_id)
+            ))
+
+    if ascending:
+        return query.order_by(created_at_column.asc(), id_column.asc()).limit(limit + 1)
+    return query.order_by(created_at_column.desc(), id_column.desc()).limit(limit + 1)
+
+def paginate_by_created_at(query, model, cursor: Optional[str], limit: int, ascending: bool = False):
+    """Keyset pagination on the model's own (created_at, id)"""
+    return keyset_paginate(query, model.created_at, model.id, cursor, limit, ascending)
+
+def split_page(items: list, limit: int, response: Response) -> list:
+    """Drop the look-ahead row and set the next-page cursor header"""
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return items
@@ -0,0 +1,184 @@
+"""
+Arquivamento de stories expiradas e índice em memória das stories ativas
+
+Uma tarefa periódica arquiva as stories expiradas em lotes: marca
+Story.archived, move as visualizações para story_views_archive
+(armazenamento frio) e move ou apaga a mídia conforme STORY_ARCHIVE_MEDIA.
+Com isso o conjunto de stories ativas fica pequeno, e cada worker o mantém
+em memória (LiveStoryIndex), atualizado por delta sobre created_at. As
+listagens continuam filtrando por expires_at no banco (índice
+(expires_at, archived)); o índice em memória só evita a query quando não há
+nenhuma story ativa e a consulta da story em POST /stories/{id}/view.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, insert, update, delete, literal
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import STORY_SWEEP_INTERVAL_SECONDS, STORY_SWEEP_BATCH_SIZE, STORY_ARCHIVE_MEDIA, STORY_INDEX_REFRESH_SECONDS
+from core.database import SessionLocal
+from core.performance_middleware import invalidate_cache_tags
+from models import Story, StoryView, ArchivedStoryView
+from utils.media_cleanup import archived_media_url, schedule_media_move, schedule_media_removal
+
+# Margem da atualização incremental: stories criadas pouco antes da última
+# atualização mas commitadas (ou replicadas) depois dela
+LIVE_INDEX_OVERLAP = timedelta(seconds=60)
+
+# Lote menor quando o servidor não tem SKIP LOCKED: com FOR UPDATE simples
+# varreduras concorrentes esperam umas pelas outras, então os locks devem ser curtos
+LOCKING_SWEEP_BATCH_SIZE = 50
+
+def supports_skip_locked(dialect) -> bool:
+    """SKIP LOCKED existe a partir do MySQL 8.0.1 e do MariaDB 10.6 (SQLite ignora FOR UPDATE)"""
+    if dialect.name != "mysql":
+        return True
+    version = dialect.server_version_info or ()
+    if getattr(dialect, "is_mariadb", False):
+        return version >= (10, 6)
+    return version >= (8, 0, 1)
+
+class LiveStoryIndex:
+    """Stories ativas (id -> expires_at) conhecidas por este worker"""
+
+    def __init__(self):
+        self._expires_at: Dict[int, datetime] = {}
+        self._synced_until: Optional[datetime] = None
+        self._last_refresh = 0.0
+        self._lock = asyncio.Lock()
+
+    def add(self, story_id: int, expires_at: datetime):
+        self._expires_at[story_id] = expires_at
+
+    def discard(self, story_id: int):
+        self._expires_at.pop(story_id, None)
+
+    def is_live(self, story_id: int) -> bool:
+        """Story conhecida por este worker e ainda não expirada"""
+        expires_at = self._expires_at.get(story_id)
+        return expires_at is not None and expires_at > datetime.utcnow()
+
+    async def refresh(self, db: AsyncSession, force: bool = False):
+        """Buscar stories criadas desde a última atualização (na primeira vez, todas as ativas)"""
+        if not force and time.monotonic() - self._last_refresh < STORY_INDEX_REFRESH_SECONDS:
+            return
+        async with self._lock:
+            if not force and time.monotonic() - self._last_refresh < STORY_INDEX_REFRESH_SECONDS:
+                return
+            now = datetime.utcnow()
+            query = select(Story.id, Story.expires_at).where(Story.archived == False, Story.expires_at > now)
+            if self._synced_until is not None and not force:
+                query = query.where(Story.created_at >= self._synced_until - LIVE_INDEX_OVERLAP)
+            else:
+                self._expires_at.clear()
+            for story_id, expires_at in (await db.execute(query)).all():
+                self._expires_at[story_id] = expires_at
+            self._synced_until = now
+            self._last_refresh = time.monotonic()
+
+    async def any_live(self, db: AsyncSession) -> bool:
+        """Há alguma story ainda não expirada? (False permite pular a listagem)"""
+        await self.refresh(db)
+        now = datetime.utcnow()
+        expired = [story_id for story_id, expires_at in self._expires_at.items() if expires_at <= now]
+        for story_id in expired:
+            del self._expires_at[story_id]
+        return bool(self._expires_at)
+
+live_stories = LiveStoryIndex()
+
+def archive_expired_stories(db: Session, batch_size: int = STORY_SWEEP_BATCH_SIZE) -> Tuple[int, List[Tuple[str, Optional[str]]]]:
+    """
+    Arquivar stories expiradas em lotes (um commit por lote).
+
+    Retorna (stories arquivadas, [(media_url, nova media_url ou None para
+    apagar)]); as operações nos arquivos ficam para depois dos commits.
+    """
+    db.use_primary = True
+    archived = 0
+    media_jobs = []
+
+    # SKIP LOCKED: vários workers podem varrer ao mesmo tempo sem pegar o mesmo
+    # lote. Sem ele (MySQL 5.7, MariaDB < 10.6), FOR UPDATE simples em lotes pequenos
+    skip_locked = supports_skip_locked(db.connection().dialect)
+    if not skip_locked:
+        batch_size = min(batch_size, LOCKING_SWEEP_BATCH_SIZE)
+
+    while True:
+        now = datetime.utcnow()
+        batch = db.execute(
+            select(Story.id, Story.media_url)
+            .where(Story.archived == False, Story.expires_at <= now)
+            .order_by(Story.expires_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=skip_locked)
+        ).all()
+        if not batch:
+            break
+
+        story_ids = [story.id for story in batch]
+
+        # Visualizações vão para o armazenamento frio
+        db.execute(insert(ArchivedStoryView).from_select(
+            ["story_id", "viewer_id", "viewed_at", "archived_at"],
+            select(StoryView.story_id, StoryView.viewer_id, StoryView.viewed_at, literal(now))
+            .where(StoryView.story_id.in_(story_ids))
+        ))
+        db.execute(delete(StoryView).where(StoryView.story_id.in_(story_ids)))
+
+        db.execute(
+            update(Story).where(Story.id.in_(story_ids))
+            .values(archived=True, archived_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+        if STORY_ARCHIVE_MEDIA in ("tier", "delete"):
+            new_urls = []
+            for story in batch:
+                if not story.media_url:
+                    continue
+                new_url = archived_media_url(story.media_url) if STORY_ARCHIVE_MEDIA == "tier" else None
+                if STORY_ARCHIVE_MEDIA == "tier" and new_url is None:
+                    continue  # Mídia externa ou já arquivada
+                new_urls.append({"id": story.id, "media_url": new_url})
+                media_jobs.append((story.media_url, new_url))
+            if new_urls:
+                db.execute(update(Story), new_urls)
+
+        db.commit()
+        archived += len(story_ids)
+
+    return archived, media_jobs
+
+def _run_sweep() -> Tuple[int, List[Tuple[str, Optional[str]]]]:
+    db = SessionLocal()
+    try:
+        return archive_expired_stories(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def story_sweeper_task():
+    """Task para arquivamento periódico das stories expiradas"""
+    while True:
+        await asyncio.sleep(STORY_SWEEP_INTERVAL_SECONDS)
+        try:
+            archived, media_jobs = await asyncio.to_thread(_run_sweep)
+            for media_url, new_media_url in media_jobs:
+                if new_media_url:
+                    schedule_media_move(media_url, new_media_url)
+                else:
+                    schedule_media_removal(media_url)
+            if archived:
+                invalidate_cache_tags("stories")
+                print(f"🗄️ {archived} stories expiradas arquivadas")
+        except Exception as e:
+            print(f"⚠️ Erro ao arquivar stories: {e}")
+
+def start_story_sweeper():
+    asyncio.create_task(story_sweeper_task())
@@ -0,0 +1,87 @@
+"""
+Bandeja de stories agrupada por autor
+
+Só entram autores que o usuário pode ver segundo User.story_visibility
+(o próprio usuário, amigos e, para stories públicas, quem ele segue),
+sem bloqueios. Cada grupo traz a contagem de stories ainda não vistas,
+calculada com um LEFT JOIN em story_views (anti-join) na mesma query do
+agrupamento. Ordem: grupos com stories não vistas primeiro, depois o mais
+recente. Stories ativas são filtradas por expires_at/archived, pelo índice
+(expires_at, archived).
+"""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, func, case, and_, or_
+
+from models import User, Story, StoryView, Follow
+from utils.loaders import story_author
+from utils.pagination import decode_cursor_with_extra, encode_cursor
+from utils.timeline import friend_ids_query, blocked_ids_query
+
+def visible_story_authors_condition(user_id: int):
+    """Condição sobre Story/User (autor) para as stories que o usuário pode ver"""
+    story_visibility = func.coalesce(User.story_visibility, "public")
+    followed_ids = select(Follow.followed_id).where(Follow.follower_id == user_id)
+    return and_(
+        Story.author_id.not_in(blocked_ids_query(user_id)),
+        or_(
+            Story.author_id == user_id,
+            and_(Story.author_id.in_(friend_ids_query(user_id)), story_visibility.in_(["public", "friends"])),
+            and_(Story.author_id.in_(followed_ids), story_visibility == "public"),
+        ),
+    )
+
+def live_stories_condition(now: datetime):
+    """Stories não expiradas e não arquivadas"""
+    return and_(Story.expires_at > now, Story.archived == False)
+
+def tray_groups_query(user_id: int, now: datetime, cursor: Optional[str], limit: int):
+    """
+    Página de grupos (author_id, latest_at, stories_count, unseen_count, all_seen).
+
+    Paginação por cursor sobre (all_seen, latest_at, author_id); uma linha
+    extra é buscada para saber se há próxima página.
+    """
+    unseen_count = func.sum(case((StoryView.id.is_(None), 1), else_=0))
+    groups = (
+        select(
+            Story.author_id.label("author_id"),
+            func.max(Story.created_at).label("latest_at"),
+            func.count(Story.id).label("stories_count"),
+            unseen_count.label("unseen_count"),
+            case((unseen_count == 0, 1), else_=0).label("all_seen"),
+        )
+        .join(User, Story.author_id == User.id)
+        .outerjoin(StoryView, and_(StoryView.story_id == Story.id, StoryView.viewer_id == user_id))
+        .where(live_stories_condition(now), visible_story_authors_condition(user_id))
+        .group_by(Story.author_id)
+        .subquery()
+    )
+
+    query = select(groups)
+    if cursor:
+        latest_at, author_id, extra = decode_cursor_with_extra(cursor)
+        all_seen = int(bool(extra.get("s")))
+        query = query.where(or_(
+            groups.c.all_seen > all_seen,
+            and_(groups.c.all_seen == all_seen, or_(
+                groups.c.latest_at < latest_at,
+                and_(groups.c.latest_at == latest_at, groups.c.author_id < author_id),
+            )),
+        ))
+
+    return query.order_by(
+        groups.c.all_seen.asc(), groups.c.latest_at.desc(), groups.c.author_id.desc()
+    ).limit(limit + 1)
+
+def tray_group_cursor(group) -> str:
+    """Cursor para a posição depois do grupo"""
+    return encode_cursor(group.latest_at, group.author_id, s=int(group.all_seen))
+
+def tray_stories_query(author_ids, now: datetime):
+    """Stories ativas dos autores da página, na ordem de exibição (mais antiga primeiro)"""
+    return (
+        select(Story).options(story_author())
+        .where(Story.author_id.in_(author_ids), live_stories_condition(now))
+        .order_by(Story.author_id, Story.created_at.asc(), Story.id.asc())
+    )
@@ -0,0 +1,136 @@
+"""
+Registro de visualizações de stories em buffer
+
+POST /stories/{id}/view só acumula (story, viewer) em memória, sem repetir
+pares. A cada STORY_VIEW_FLUSH_INTERVAL_MS o buffer é gravado em uma
+transação: um INSERT IGNORE de várias linhas por story (o índice único
+(story_id, viewer_id) descarta repetições, inclusive de outros workers) e
+um único UPDATE que soma em views_count exatamente as linhas inseridas.
+No desligamento o buffer é gravado antes de fechar os engines.
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select, insert, update, case, func
+from sqlalchemy.orm import Session
+
+from core.config import STORY_VIEW_FLUSH_INTERVAL_MS, STORY_VIEW_BUFFER_MAX
+from core.database import SessionLocal
+from core.performance_middleware import invalidate_cache_tags
+from models import Story, StoryView
+
+# (story_id, viewer_id) -> viewed_at da primeira visualização no intervalo
+_pending_views: Dict[Tuple[int, int], datetime] = {}
+_flush_task: Optional[asyncio.Task] = None
+_flush_requested: Optional[asyncio.Event] = None
+_flush_lock = asyncio.Lock()
+
+def write_story_views(db: Session, views: Dict[Tuple[int, int], datetime]) -> Dict[int, int]:
+    """Gravar as visualizações e atualizar views_count. Retorna story_id -> visualizações novas"""
+    by_story: Dict[int, list] = {}
+    for (story_id, viewer_id), viewed_at in views.items():
+        by_story.setdefault(story_id, []).append(
+            {"story_id": story_id, "viewer_id": viewer_id, "viewed_at": viewed_at}
+        )
+
+    # Stories apagadas ou arquivadas desde a visualização (inclusive por outro worker)
+    # são descartadas: o arquivamento já moveu as visualizações para story_views_archive
+    existing = set(db.execute(
+        select(Story.id).where(Story.id.in_(by_story), Story.archived == False)
+    ).scalars())
+
+    new_views = {}
+    for story_id, rows in by_story.items():
+        if story_id not in existing:
+            continue
+        inserted = db.execute(
+            insert(StoryView).values(rows)
+            .prefix_with("IGNORE", dialect="mysql")
+            .prefix_with("OR IGNORE", dialect="sqlite")
+        ).rowcount
+        if inserted:
+            new_views[story_id] = inserted
+
+    if new_views:
+        db.execute(
+            update(Story)
+            .where(Story.id.in_(new_views))
+            .values(views_count=func.coalesce(Story.views_count, 0) + case(new_views, value=Story.id, else_=0))
+            .execution_options(synchronize_session=False)
+        )
+    return new_views
+
+def _write_batch(views: Dict[Tuple[int, int], datetime]) -> Dict[int, int]:
+    db = SessionLocal()
+    try:
+        new_views = write_story_views(db, views)
+        db.commit()
+        return new_views
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def flush_story_views() -> int:
+    """Gravar o buffer atual. Em caso de erro as visualizações voltam para o buffer"""
+    global _pending_views
+    async with _flush_lock:
+        if not _pending_views:
+            return 0
+        views, _pending_views = _pending_views, {}
+        try:
+            new_views = await asyncio.to_thread(_write_batch, views)
+        except Exception:
+            for key, viewed_at in views.items():
+                _pending_views.setdefault(key, viewed_at)
+            raise
+
+    if new_views:
+        invalidate_cache_tags(*(f"story:{story_id}" for story_id in new_views))
+    return sum(new_views.values())
+
+async def record_story_view(story_id: int, viewer_id: int):
+    """Acumular uma visualização para a próxima gravação"""
+    _pending_views.setdefault((story_id, viewer_id), datetime.utcnow())
+
+    if _flush_task is None:
+        # Flusher não iniciado (scripts, testes): gravar na hora
+        await flush_story_views()
+    elif len(_pending_views) >= STORY_VIEW_BUFFER_MAX:
+        _flush_requested.set()
+
+async def story_view_flusher():
+    """Task que grava o buffer a cada STORY_VIEW_FLUSH_INTERVAL_MS (ou antes, se ele encher)"""
+    while True:
+        try:
+            await asyncio.wait_for(_flush_requested.wait(), timeout=STORY_VIEW_FLUSH_INTERVAL_MS / 1000)
+        except asyncio.TimeoutError:
+            pass
+        _flush_requested.clear()
+        try:
+            await flush_story_views()
+        except Exception as e:
+            print(f"⚠️ Erro ao gravar visualizações de stories ({len(_pending_views)} pendentes): {e}")
+
+def start_story_view_flusher():
+    global _flush_task, _flush_requested
+    _flush_requested = asyncio.Event()
+    _flush_task = asyncio.create_task(story_view_flusher())
+
+async def stop_story_view_flusher():
+    """Parar a task e gravar o que ainda está no buffer"""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    try:
+        written = await flush_story_views()
+        if written:
+            print(f"💾 {written} visualizações de stories gravadas no desligamento")
+    except Exception as e:
+        print(f"❌ Erro ao gravar visualizações de stories no desligamento: {e}")
@@ -0,0 +1,195 @@
+"""
+Timeline materializada: fan-out dos posts na escrita e leitura da timeline
+
+Cada post é copiado (só o id) para a timeline de quem pode vê-lo no momento
+da criação, respeitando Post.privacy e bloqueios. Autores com audiência maior
+que TIMELINE_FANOUT_MAX_AUDIENCE não recebem fan-out: seus posts são buscados
+na leitura e mesclados com a timeline materializada (modelo híbrido).
+"""
+from typing import List, Optional
+from sqlalchemy import select, insert, delete, union, literal, func, and_, or_
+from sqlalchemy.orm import Session
+
+from core.config import TIMELINE_FANOUT_MAX_AUDIENCE, TIMELINE_BACKFILL_POSTS
+from models import Post, Friendship, Follow, Block, TimelineEntry, TimelinePullAuthor
+from utils.loaders import post_author
+from utils.pagination import keyset_paginate
+
+TIMELINE_COLUMNS = ["user_id", "post_id", "author_id", "created_at"]
+
+def friend_ids_query(user_id: int):
+    """Ids dos amigos aceitos (uma consulta por lado, para usar os índices de friendships)"""
+    return union(
+        select(Friendship.addressee_id.label("user_id")).where(
+            Friendship.requester_id == user_id, Friendship.status == "accepted"
+        ),
+        select(Friendship.requester_id.label("user_id")).where(
+            Friendship.addressee_id == user_id, Friendship.status == "accepted"
+        ),
+    )
+
+def blocked_ids_query(user_id: int):
+    """Ids de quem bloqueou ou foi bloqueado pelo usuário"""
+    return union(
+        select(Block.blocked_id.label("user_id")).where(Block.blocker_id == user_id),
+        select(Block.blocker_id.label("user_id")).where(Block.blocked_id == user_id),
+    )
+
+def audience_query(author_id: int, privacy: str):
+    """Usuários que podem ver um post do autor com a privacidade informada (inclui o autor)"""
+    selects = [select(literal(author_id).label("user_id"))]
+    if privacy != "private":
+        selects += [
+            select(Friendship.addressee_id.label("user_id")).where(
+                Friendship.requester_id == author_id, Friendship.status == "accepted"
+            ),
+            select(Friendship.requester_id.label("user_id")).where(
+                Friendship.addressee_id == author_id, Friendship.status == "accepted"
+            ),
+        ]
+    if privacy == "public":
+        selects.append(select(Follow.follower_id.label("user_id")).where(Follow.followed_id == author_id))
+
+    audience = union(*selects).subquery()
+    return select(audience.c.user_id).where(audience.c.user_id.not_in(blocked_ids_query(author_id)))
+
+def _insert_ignore(rows_query):
+    """INSERT ... SELECT ignorando entradas que já existem na timeline"""
+    return (
+        insert(TimelineEntry)
+        .from_select(TIMELINE_COLUMNS, rows_query)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+
+def is_pull_author(db: Session, author_id: int) -> bool:
+    return db.get(TimelinePullAuthor, author_id) is not None
+
+def fan_out_post(db: Session, post: Post) -> int:
+    """
+    Materializar o post nas timelines da audiência (um único INSERT ... SELECT).
+
+    Deve ser chamado depois do flush do post, na mesma transação. Em sessões
+    assíncronas use `await db.run_sync(fan_out_post, post)`.
+    """
+    audience = audience_query(post.author_id, post.privacy or "public")
+
+    if post.privacy != "private":
+        pull_author = is_pull_author(db, post.author_id)
+        if not pull_author:
+            audience_size = db.scalar(select(func.count()).select_from(audience.subquery()))
+            if audience_size > TIMELINE_FANOUT_MAX_AUDIENCE:
+                db.add(TimelinePullAuthor(author_id=post.author_id))
+                pull_author = True
+                print(f"📣 Autor {post.author_id} passou a usar timeline por leitura ({audience_size} leitores)")
+
+        # Leitores de autores grandes buscam os posts na leitura; só o autor recebe a entrada
+        if pull_author:
+            audience = select(literal(post.author_id).label("user_id"))
+
+    rows = audience.subquery()
+    result = db.execute(_insert_ignore(select(
+        rows.c.user_id,
+        literal(post.id),
+        literal(post.author_id),
+        literal(post.created_at),
+    )))
+    return result.rowcount
+
+def post_timeline_tags(db: Session, post: Post) -> List[str]:
+    """
+    Tags de cache das timelines que passam a mostrar o post (chamar depois de
+    fan_out_post, antes do commit): as timelines que receberam a entrada ou,
+    para autores sem fan-out, a tag author_posts que os leitores recebem.
+    """
+    author_tag = f"timeline:{post.author_id}"
+    if post.privacy == "private":
+        return [author_tag]
+
+    became_pull_author = any(
+        isinstance(obj, TimelinePullAuthor) and obj.author_id == post.author_id for obj in db.new
+    )
+    if became_pull_author:
+        # As timelines em cache dos leitores ainda não têm a tag author_posts
+        return ["posts", author_tag, f"author_posts:{post.author_id}"]
+    if is_pull_author(db, post.author_id):
+        return [author_tag, f"author_posts:{post.author_id}"]
+
+    reader_ids = db.scalars(select(TimelineEntry.user_id).where(TimelineEntry.post_id == post.id)).all()
+    return [f"timeline:{user_id}" for user_id in reader_ids]
+
+def refresh_author_in_timeline(db: Session, user_id: int, author_id: int):
+    """
+    Recalcular os posts do autor na timeline do usuário após mudar a relação
+    entre eles (seguir, deixar de seguir, amizade aceita ou desfeita).
+    """
+    db.execute(delete(TimelineEntry).where(
+        TimelineEntry.user_id == user_id,
+        TimelineEntry.author_id == author_id
+    ))
+
+    if is_pull_author(db, author_id):
+        return
+
+    is_friend = db.execute(
+        select(literal(1)).where(literal(author_id).in_(friend_ids_query(user_id)))
+    ).first() is not None
+    is_follower = db.execute(select(Follow.id).where(
+        Follow.follower_id == user_id, Follow.followed_id == author_id
+    )).first() is not None
+    blocked = db.execute(
+        select(literal(1)).where(literal(author_id).in_(blocked_ids_query(user_id)))
+    ).first() is not None
+
+    if blocked or not (is_friend or is_follower):
+        return
+
+    visible = ["public", "friends"] if is_friend else ["public"]
+    recent_posts = (
+        select(literal(user_id), Post.id, Post.author_id, Post.created_at)
+        .where(Post.author_id == author_id, Post.privacy.in_(visible))
+        .order_by(Post.created_at.desc())
+        .limit(TIMELINE_BACKFILL_POSTS)
+    )
+    db.execute(_insert_ignore(recent_posts))
+
+def refresh_relationship_timelines(db: Session, user_id: int, other_user_id: int):
+    """Recalcular as timelines dos dois lados de uma relação"""
+    refresh_author_in_timeline(db, user_id, other_user_id)
+    refresh_author_in_timeline(db, other_user_id, user_id)
+
+def materialized_timeline_query(user_id: int, cursor: Optional[str], limit: int):
+    """Página da timeline materializada, ordenada pelo índice (user_id, created_at, post_id)"""
+    query = (
+        select(Post)
+        .join(TimelineEntry, TimelineEntry.post_id == Post.id)
+        .options(post_author())
+        .where(TimelineEntry.user_id == user_id)
+    )
+    return keyset_paginate(query, TimelineEntry.created_at, TimelineEntry.post_id, cursor, limit)
+
+def pull_authors_query(user_id: int):
+    """Autores sem fan-out que o usuário segue ou de quem é amigo"""
+    followed_ids = select(Follow.followed_id).where(Follow.follower_id == user_id)
+    return select(TimelinePullAuthor.author_id).where(or_(
+        TimelinePullAuthor.author_id.in_(followed_ids),
+        TimelinePullAuthor.author_id.in_(friend_ids_query(user_id)),
+    ))
+
+def pulled_timeline_query(user_id: int, pull_author_ids: List[int], cursor: Optional[str], limit: int):
+    """Página de posts dos autores sem fan-out do usuário (ids de pull_authors_query)"""
+    friend_ids = friend_ids_query(user_id)
+    query = select(Post).options(post_author()).where(
+        Post.author_id.in_(pull_author_ids),
+        Post.author_id.not_in(blocked_ids_query(user_id)),
+        or_(
+            Post.privacy == "public",
+            and_(Post.privacy == "friends", Post.author_id.in_(friend_ids)),
+        ),
+    )
+    return keyset_paginate(query, Post.created_at, Post.id, cursor, limit)
+
+def merge_timeline_pages(*pages: List[Post]) -> List[Post]:
+    """Mesclar páginas já ordenadas em uma só, mais recente primeiro, sem repetir posts"""
+    posts = {post.id: post for page in pages for post in page}
+    return sorted(posts.values(), key=lambda post: (post.created_at, post.id), reverse=True)
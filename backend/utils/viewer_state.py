@@ -0,0 +1,59 @@
+"""
+Estado do usuário logado em relação a uma página de posts ou stories
+
+Reação do usuário, stories já vistas e amizade com os autores são
+resolvidas com uma query IN por página, em vez de uma por item. As funções
+são síncronas; em sessões assíncronas use
+`await db.run_sync(resolve_post_viewer_state, user_id, posts)`.
+"""
+from typing import Dict, Iterable, Set, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Post, Reaction, Story, StoryView
+from utils.timeline import friend_ids_query
+
+def my_reactions(db: Session, user_id: int, post_ids: Iterable[int]) -> Dict[int, str]:
+    """post_id -> tipo da reação do usuário nos posts informados"""
+    post_ids = set(post_ids)
+    if not post_ids:
+        return {}
+    rows = db.execute(select(Reaction.post_id, Reaction.reaction_type).where(
+        Reaction.user_id == user_id,
+        Reaction.post_id.in_(post_ids)
+    ))
+    return dict(rows.all())
+
+def viewed_story_ids(db: Session, user_id: int, story_ids: Iterable[int]) -> Set[int]:
+    """Stories, dentre as informadas, que o usuário já visualizou"""
+    story_ids = set(story_ids)
+    if not story_ids:
+        return set()
+    return set(db.scalars(select(StoryView.story_id).where(
+        StoryView.viewer_id == user_id,
+        StoryView.story_id.in_(story_ids)
+    )).all())
+
+def friend_ids_among(db: Session, user_id: int, user_ids: Iterable[int]) -> Set[int]:
+    """Usuários, dentre os informados, que são amigos do usuário"""
+    user_ids = set(user_ids) - {user_id}
+    if not user_ids:
+        return set()
+    friends = friend_ids_query(user_id).subquery()
+    return set(db.scalars(select(friends.c.user_id).where(friends.c.user_id.in_(user_ids))).all())
+
+def resolve_post_viewer_state(db: Session, user_id: int, posts: Iterable[Post]) -> Tuple[Dict[int, str], Set[int]]:
+    """(reações do usuário por post, amigos entre os autores) para uma página de posts"""
+    posts = list(posts)
+    return (
+        my_reactions(db, user_id, (post.id for post in posts)),
+        friend_ids_among(db, user_id, (post.author_id for post in posts)),
+    )
+
+def resolve_story_viewer_state(db: Session, user_id: int, stories: Iterable[Story]) -> Tuple[Set[int], Set[int]]:
+    """(stories já vistas, amigos entre os autores) para uma página de stories"""
+    stories = list(stories)
+    return (
+        viewed_story_ids(db, user_id, (story.id for story in stories)),
+        friend_ids_among(db, user_id, (story.author_id for story in stories)),
+    )